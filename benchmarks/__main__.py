@@ -0,0 +1,52 @@
+"""
+Run the simulator benchmark suite.
+
+    python -m benchmarks                      # all suites, table on stdout
+    python -m benchmarks --only codec udp     # selected suites
+    python -m benchmarks --json results.json  # also write JSON for diffing between releases
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_codec, bench_dispatch, bench_physics, bench_udp
+from benchmarks.common import report
+
+SUITES = {'dispatch': bench_dispatch,
+          'codec': bench_codec,
+          'physics': bench_physics,
+          'udp': bench_udp}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulator hot path benchmarks')
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=list(SUITES), help='suites to run')
+    parser.add_argument('--json', metavar='PATH', help='write results as JSON to PATH')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only:
+        print(f'Running {name} benchmarks...', file=sys.stderr)
+        results.update(SUITES[name].run())
+    report(results)
+
+    if args.json:
+        doc = {'meta': {'revision': git_revision(),
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+               'results': results}
+        with open(args.json, 'w') as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+        print(f'Results written to {args.json}', file=sys.stderr)
@@ -0,0 +1,52 @@
+"""
+Benchmark of the protocol codec against the helpers that used to be inlined in run_simulation.
+
+Run from the repository root: python -m benchmarks.bench_codec
+"""
+import re
+
+import protocol
+from benchmarks.common import measure, report, summarize
+
+REQUEST = b'$a MAC MAV MBC MP MFA MF1 MF2 MF3 SP1D 12.5 RP1D#'
+RESPONSE = 'a 42.17 80.2 42.17 16 0x0000 0x0000 0x0000 0x0000 0x0000 0x0000 0 0 0 12.5 12.5'
+
+
+def legacy_strip_msg(bdata):
+    sdata = bdata.decode('UTF-8')
+    pat = re.compile('\\$[a-z](.+?)#')  # Match all characters between $? and #
+    m = pat.match(sdata)
+    return m.group(0)[1], m.group(1).split()
+
+
+def legacy_generate_checksum(message):
+    s = 0
+    for i in range(len(message)):
+        s += ord(message[i])
+    return hex(~s & 0xff).upper()
+
+
+def legacy_send_msg(message, seq):
+    chk = legacy_generate_checksum(seq + ' ' + message)
+    respstr = f'{seq} {message}#{chk[2:].zfill(2)}\r'
+    return respstr.encode('utf-8')
+
+
+def run():
+    """
+    :return: dict of benchmark name -> summary
+    """
+    seq, message = RESPONSE.split(' ', 1)
+    bseq = seq.encode()
+    assert legacy_send_msg(message, seq) == protocol.encode_response(bseq, message.encode('utf-8'))
+    assert legacy_strip_msg(REQUEST)[1] == protocol.decode_request(REQUEST)[1]
+    return {
+        'codec/decode/legacy': summarize(measure(lambda: legacy_strip_msg(REQUEST))),
+        'codec/decode/codec': summarize(measure(lambda: protocol.decode_request(REQUEST))),
+        'codec/encode/legacy': summarize(measure(lambda: legacy_send_msg(message, seq))),
+        'codec/encode/codec': summarize(measure(lambda: protocol.encode_response(bseq, message.encode('utf-8')))),
+    }
+
+
+if __name__ == '__main__':
+    report(run())
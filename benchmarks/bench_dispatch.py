@@ -0,0 +1,73 @@
+"""
+Per-command dispatch latency through GenSimulator.exec_func.
+
+Run from the repository root: python -m benchmarks.bench_dispatch
+"""
+import contextlib
+import os
+
+import protocol
+import simulator
+from persistence import TubeStore
+from benchmarks.common import measure, report, scratch_dir, summarize
+
+# Requests covering monitor, read, set, generated and unknown commands
+COMMANDS = (['MAC'],
+            ['MAV'],
+            ['MP'],
+            ['MFA'],
+            ['MF3'],
+            ['RCAT'],
+            ['RP2W'],
+            ['SP1D', '12.5'],
+            ['SBV', '50'],
+            ['U', 'TMFP'],
+            ['IC', '[', 'x'],
+            ['XYZ'])
+
+
+def legacy_handle_msg(sim, data):
+    # handle_msg without the cache fast path: every command through exec_func, responses joined and encoded at the end
+    seq, tokens = protocol.decode_request(data)
+    sim._pinned = sim.published
+    resp_list = []
+    i = 0
+    try:
+        while i < len(tokens):
+            resp, i = sim.exec_func(tokens, i)
+            resp_list.append(resp)
+    finally:
+        sim._pinned = None
+    return protocol.encode_response(seq, ' '.join(resp_list).encode('utf-8'))
+
+
+def run():
+    """
+    :return: dict of benchmark name -> summary
+    """
+    results = {}
+    # Commands that print (unknown mnemonics, unimplemented commands) still pay for it, but into /dev/null
+    with scratch_dir(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sim = simulator.GenSimulator(tube_str='BENCH', seed=1, store=TubeStore(path=None))
+        sim.debug = False
+        for tokens in COMMANDS:
+            samples = measure(lambda: sim.exec_func(tokens, 0))
+            results[f'dispatch/{tokens[0]}'] = summarize(samples)
+        request = b'$a MAC MAV MBC MP MFA MF1 MF2 MF3 SP1D 12.5 RP1D#'
+        pipelined = b'$a ' + b'MAC MAV MBC MTP MTT MP MFA MF1 MF2 MF3 ' * 4 + b'#'
+        uncached = b'$a ' + b'RP1D RPF RPD RCAT MRR MRV MSV ' * 6 + b'#'
+        assert legacy_handle_msg(sim, pipelined) == sim.handle_msg(pipelined)
+        assert legacy_handle_msg(sim, uncached) == sim.handle_msg(uncached)
+        results['dispatch/pipelined_40_monitors/legacy'] = summarize(measure(lambda: legacy_handle_msg(sim, pipelined)))
+        results['dispatch/pipelined_40_monitors'] = summarize(measure(lambda: sim.handle_msg(pipelined)))
+        results['dispatch/pipelined_42_uncached/legacy'] = summarize(measure(lambda: legacy_handle_msg(sim, uncached)))
+        results['dispatch/pipelined_42_uncached'] = summarize(measure(lambda: sim.handle_msg(uncached)))
+        results['dispatch/handle_msg_11_cmds'] = summarize(measure(lambda: sim.handle_msg(request)))
+        sim.enable_metrics()
+        results['dispatch/handle_msg_11_cmds_metrics'] = summarize(measure(lambda: sim.handle_msg(request)))
+        sim.disable_metrics()
+    return results
+
+
+if __name__ == '__main__':
+    report(run())
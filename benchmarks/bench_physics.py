@@ -0,0 +1,60 @@
+"""
+Physics tick throughput of the svc_* methods (GenSimulator.tick) and of the vectorized fleet step.
+
+Run from the repository root: python -m benchmarks.bench_physics
+"""
+import contextlib
+import os
+
+import simulator
+from persistence import TubeStore
+from benchmarks.common import measure, report, scratch_dir, summarize
+
+FLEET_SIZES = (1, 100, 1000)
+
+
+def ops_per_sec(samples):
+    return round(len(samples) / (sum(samples) / 1e9), 1)
+
+
+def run():
+    """
+    :return: dict of benchmark name -> summary
+    """
+    results = {}
+    with scratch_dir():
+        sim = simulator.GenSimulator(tube_str='BENCH', seed=1, store=TubeStore(path=None))
+        sim.fault_1 = 0
+        sim.C()
+        dt = 1 / sim.tick_rate
+        for state in ('idle', 'running'):
+            if state == 'running':
+                sim.N('80')
+                sim.NEUTRONS_RAMP_TIME = 0
+            samples = measure(lambda: sim.tick(dt))
+            results[f'physics/tick/{state}'] = summarize(samples, ops_per_sec=ops_per_sec(samples))
+        for name in ('svc_gen_state', 'svc_accel_voltage', 'svc_accel_current', 'svc_getter_current',
+                     'svc_environment'):
+            func = getattr(sim, name)
+            if name == 'svc_gen_state':
+                samples = measure(func)
+            else:
+                samples = measure(lambda: func(dt))
+            results[f'physics/{name}'] = summarize(samples, ops_per_sec=ops_per_sec(samples))
+
+        try:
+            from fleet import GenFleet
+        except ImportError:
+            print('NumPy not available, skipping fleet benchmarks')
+            return results
+        for size in FLEET_SIZES:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                fleet = GenFleet(size, seed=1, store=TubeStore(path=None))
+            samples = measure(lambda: fleet.step(dt), iterations=2000, warmup=100)
+            results[f'physics/fleet_step/{size}'] = summarize(samples, ops_per_sec=ops_per_sec(samples),
+                                                              unit_ticks_per_sec=ops_per_sec(samples) * size)
+    return results
+
+
+if __name__ == '__main__':
+    report(run())
@@ -0,0 +1,102 @@
+"""
+End-to-end UDP round trip latency and request throughput against a loopback run_simulation, for both the
+asyncio server and the bulk I/O server.
+
+Run from the repository root: python -m benchmarks.bench_udp
+"""
+import collections
+import socket
+import threading
+import time
+
+import simulator
+from persistence import TubeStore
+from benchmarks.common import report, scratch_dir, summarize
+
+BASE_PORT = 47000
+REQUEST = b'$a MAC MAV MP#'
+
+
+def start_server(bulk_io, inp_port, out_port):
+    sim = simulator.GenSimulator(tube_str='BENCH', gen_ip_num='127.0.0.1', seed=1,
+                                 store=TubeStore(path=None))
+    sim.gen_inp_port = inp_port
+    sim.gen_out_port = out_port
+    sim.response_delay = 0
+    threading.Thread(target=sim.run_simulation, kwargs={'bulk_io': bulk_io}, name='BenchServer', daemon=True).start()
+    return sim
+
+
+def round_trips(send, recv, count):
+    """
+    :return: (list of int round trip times in ns, number of lost replies)
+    """
+    samples = []
+    lost = 0
+    for _ in range(count):
+        t0 = time.perf_counter_ns()
+        send(REQUEST)
+        try:
+            recv(1024)
+        except socket.timeout:
+            lost += 1
+            continue
+        samples.append(time.perf_counter_ns() - t0)
+    return samples, lost
+
+
+def closed_loop(send, recv, count, inflight):
+    """
+    Description: Keep inflight requests outstanding until count replies have been received. Replies are matched
+    to requests in FIFO order (loopback does not reorder), giving the latency under load.
+    :return: (list of int latencies in ns, float requests per second, number of lost replies)
+    """
+    clock = time.perf_counter_ns
+    outstanding = collections.deque()
+    samples = []
+    lost = 0
+    t0 = clock()
+    for _ in range(inflight):
+        outstanding.append(clock())
+        send(REQUEST)
+    sent = inflight
+    while len(samples) + lost < count:
+        try:
+            recv(1024)
+            samples.append(clock() - outstanding.popleft())
+        except socket.timeout:
+            lost += len(outstanding)     # Everything outstanding is lost
+            outstanding.clear()
+        while sent < count and len(outstanding) < inflight:
+            outstanding.append(clock())
+            send(REQUEST)
+            sent += 1
+    return samples, len(samples) / ((clock() - t0) / 1e9), lost
+
+
+def run(count=2000, inflight=16):
+    """
+    :return: dict of benchmark name -> summary
+    """
+    results = {}
+    with scratch_dir():
+        for i, (mode, bulk_io) in enumerate((('asyncio', False), ('bulk', True))):
+            inp_port, out_port = BASE_PORT + 2 * i, BASE_PORT + 2 * i + 1
+            rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            rx.bind(('127.0.0.1', out_port))
+            rx.settimeout(1)
+            tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            tx.connect(('127.0.0.1', inp_port))
+            start_server(bulk_io, inp_port, out_port)
+            time.sleep(0.5)     # Let the server bind
+            samples, lost = round_trips(tx.send, rx.recv, count)
+            results[f'udp/{mode}/round_trip'] = summarize(samples, lost=lost)
+            samples, rps, lost = closed_loop(tx.send, rx.recv, count * 5, inflight)
+            results[f'udp/{mode}/closed_loop_{inflight}'] = summarize(samples, ops_per_sec=round(rps, 1), lost=lost)
+            rx.close()
+            tx.close()
+    return results
+
+
+if __name__ == '__main__':
+    report(run())
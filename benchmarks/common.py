@@ -0,0 +1,81 @@
+import contextlib
+import os
+import tempfile
+import time
+
+
+def measure(func, iterations=20000, warmup=1000):
+    """
+    Description: Time individual calls of func
+    :param func: callable taking no arguments
+    :param iterations: number of timed calls
+    :param warmup: number of untimed calls made first
+    :return: list of int (nanoseconds per call)
+    """
+    for _ in range(warmup):
+        func()
+    clock = time.perf_counter_ns
+    samples = []
+    append = samples.append
+    for _ in range(iterations):
+        t0 = clock()
+        func()
+        append(clock() - t0)
+    return samples
+
+
+def percentile(ordered, pct):
+    """
+    :param ordered: sorted list of samples
+    :param pct: float in [0, 100]
+    :return: nearest-rank percentile
+    """
+    if not ordered:
+        return 0
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(samples, **extra):
+    """
+    Description: Reduce latency samples (ns) to the figures reported by the suite
+    :param samples: list of int (nanoseconds)
+    :param extra: additional figures to include (e.g. ops_per_sec)
+    :return: dict
+    """
+    ordered = sorted(samples)
+    summary = {'n': len(ordered),
+               'mean_ns': round(sum(ordered) / len(ordered), 1) if ordered else 0,
+               'p50_ns': percentile(ordered, 50),
+               'p99_ns': percentile(ordered, 99),
+               'max_ns': ordered[-1] if ordered else 0}
+    summary.update(extra)
+    return summary
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """
+    Description: Run the enclosed block in a temporary working directory, so simulators created by a
+    benchmark do not leave tube info files behind
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='gensim-bench-') as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
+
+
+def report(results):
+    """
+    Description: Print benchmark summaries as a table
+    :param results: dict of benchmark name -> summary
+    :return: n/a
+    """
+    print(f'{"benchmark":52s} {"p50 ns":>10s} {"p99 ns":>10s} {"mean ns":>10s} {"ops/s":>12s}')
+    for name, summary in results.items():
+        ops = summary.get('ops_per_sec')
+        print(f'{name:52s} {summary["p50_ns"]:10.0f} {summary["p99_ns"]:10.0f} {summary["mean_ns"]:10.0f} '
+              f'{"" if ops is None else f"{ops:12.0f}"}')
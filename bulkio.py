@@ -0,0 +1,103 @@
+import heapq
+import itertools
+import select
+import socket
+import time
+
+
+class DatagramBatcher:
+    """
+    Bulk datagram I/O on a UDP socket. Each pass drains every readable datagram with non-blocking
+    recvfrom_into calls into a preallocated ring of buffers, and replies are queued and flushed
+    together, so the per-packet wakeup, syscall and allocation overhead is amortized over a burst.
+
+    Datagrams returned by drain() are memoryviews into the ring and are only valid until the next
+    call to drain().
+    """
+    def __init__(self, sock, send_sock=None, ring_size=64, bufsize=1024, rcvbuf=1 << 20):
+        """
+        :param sock: bound UDP socket to receive on (switched to non-blocking)
+        :param send_sock: socket to send replies from (default: sock)
+        :param ring_size: maximum number of datagrams returned per drain()
+        :param bufsize: size of each receive buffer (longer datagrams are truncated, as with recvfrom)
+        :param rcvbuf: kernel receive buffer size to request so bursts are queued rather than dropped (None to keep
+        the system default)
+        """
+        sock.setblocking(False)
+        if rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock = sock
+        self.send_sock = sock if send_sock is None else send_sock
+        self.views = [memoryview(bytearray(bufsize)) for _ in range(ring_size)]
+        self.outbox = []        # Replies ready to send: (data, addr)
+        self.delayed = []       # Heap of replies not yet due: (due, n, data, addr)
+        self._count = itertools.count()
+
+    def wait(self, timeout=None):
+        """
+        Description: Block until the socket is readable, a delayed reply is due or timeout expires
+        :param timeout: float seconds (None to wait indefinitely for a datagram or a due reply)
+        :return: bool (True if the socket is readable)
+        """
+        due = self.next_due()
+        if due is not None:
+            timeout = due if timeout is None else min(timeout, due)
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def drain(self):
+        """
+        Description: Receive every datagram currently readable, up to the ring size
+        :return: list of (memoryview, addr)
+        """
+        batch = []
+        recvfrom_into = self.sock.recvfrom_into
+        for view in self.views:
+            try:
+                n, addr = recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            batch.append((view[:n], addr))
+        return batch
+
+    def queue(self, data, addr, delay=0):
+        """
+        Description: Queue a reply for the next flush()
+        :param data: bytes
+        :param addr: (ip, port) destination
+        :param delay: float seconds to hold the reply back before it is sent
+        :return: n/a
+        """
+        if delay > 0:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self._count), data, addr))
+        else:
+            self.outbox.append((data, addr))
+
+    def next_due(self):
+        """
+        :return: float seconds until the next delayed reply is due (0 if overdue), None if there are none
+        """
+        if not self.delayed:
+            return None
+        return max(self.delayed[0][0] - time.monotonic(), 0)
+
+    def flush(self):
+        """
+        Description: Send every queued reply and every delayed reply that is due. Replies that do not fit in the
+        socket send buffer stay queued for the next flush.
+        :return: int (number of datagrams sent)
+        """
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, data, addr = heapq.heappop(self.delayed)
+            self.outbox.append((data, addr))
+        sendto = self.send_sock.sendto
+        sent = 0
+        for data, addr in self.outbox:
+            try:
+                sendto(data, addr)
+            except (BlockingIOError, InterruptedError):
+                break
+            sent += 1
+        del self.outbox[:sent]
+        return sent
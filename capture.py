@@ -0,0 +1,207 @@
+import argparse
+import json
+import struct
+import threading
+import time
+
+from control import ControlPlane
+
+MAGIC = b'GSCAP1\n'
+HEADER_LEN = struct.Struct('<I')
+RECORD = struct.Struct('<cIqI')     # kind, tick, nanoseconds since start of capture, payload length
+
+# Record kinds
+INBOUND = b'I'      # Request datagram, tick of the snapshot it was served from
+OUTBOUND = b'O'     # Response datagram to the preceding request
+CONTROL = b'C'      # Control plane command (utf-8 text)
+APPLIED = b'A'      # Number of posted updates applied at the start of a tick (payload: uint32)
+
+COUNT = struct.Struct('<I')
+
+
+class CaptureWriter:
+    """
+    Writes a simulator session to a compact binary log: a magic line, a length-prefixed JSON header
+    (seed, tick rate, initial state) and one fixed-size record header plus payload per event.
+
+    Every event carries the physics tick it happened at, so the session can be replayed in lockstep
+    with the physics (see Replayer) independently of the wall-clock timing of the capture. Writes from
+    the server, control and physics threads are serialized by a lock.
+    """
+    def __init__(self, path, header):
+        """
+        :param path: str (log file)
+        :param header: dict (JSON serializable description of the simulator at the start of the capture)
+        """
+        self.f = open(path, 'wb')
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic_ns()
+        blob = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        self.f.write(MAGIC + HEADER_LEN.pack(len(blob)) + blob)
+        self.records = 0
+
+    def write(self, kind, tick, payload):
+        with self.lock:
+            self.f.write(RECORD.pack(kind, tick, time.monotonic_ns() - self.t0, len(payload)))
+            self.f.write(payload)
+            self.records += 1
+
+    def inbound(self, tick, data):
+        self.write(INBOUND, tick, bytes(data))
+
+    def outbound(self, tick, data):
+        self.write(OUTBOUND, tick, data)
+
+    def control(self, tick, cmd):
+        self.write(CONTROL, tick, ' '.join(cmd).encode('utf-8'))
+
+    def applied(self, tick, count):
+        self.write(APPLIED, tick, COUNT.pack(count))
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+def read_capture(path):
+    """
+    Description: Read a capture log
+    :param path: str
+    :return: (dict header, list of (kind, tick, ns, payload bytes))
+    :raises ValueError: if the file is not a capture log
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} is not a simulator capture')
+    pos = len(MAGIC)
+    (n,) = HEADER_LEN.unpack_from(data, pos)
+    pos += HEADER_LEN.size
+    header = json.loads(data[pos:pos + n])
+    pos += n
+    records = []
+    while pos < len(data):
+        kind, tick, ns, n = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        records.append((kind, tick, ns, data[pos:pos + n]))
+        pos += n
+    return header, records
+
+
+class Replayer:
+    """
+    Re-drives a captured session against a fresh simulator and verifies the responses byte for byte.
+
+    The simulator is rebuilt from the capture header (same seed, tick rate and initial state) and its
+    physics is stepped in lockstep with the log instead of by the scheduler: each request is served
+    from the snapshot of the tick it was served from during the capture, and posted updates are
+    applied at the same ticks. Replay is paced by the capture timestamps unless max_speed is set.
+    """
+    def __init__(self, path, max_speed=False, verbose=False):
+        self.header, self.records = read_capture(path)
+        self.max_speed = max_speed
+        self.verbose = verbose
+        self.sim = self.build_simulator(self.header)
+        self.control = ControlPlane(self.sim, lambda ip, msg: None)
+        self.snaps = {self.sim.tick_count: self.sim.published}    # tick -> snapshot published by that tick
+        self.requests = self.matched = self.mismatched = self.controls = 0
+        self.mismatches = []
+
+    @staticmethod
+    def build_simulator(header):
+        """
+        :param header: dict (capture header)
+        :return: GenSimulator in the state it was in when the capture started
+        """
+        from clock import SimClock
+        from persistence import TubeStore
+        from simulator import GenSimulator
+
+        sim = GenSimulator(gen_type=header['gen_type'], tube_str=header['tube_str'], tick_rate=header['tick_rate'],
+                           seed=header['seed'], store=TubeStore(path=None),
+                           clock=SimClock(header['clock_scale'], start=header['clock']))
+        for attr, val in header['state'].items():
+            setattr(sim, attr, val)
+        sim.scheduler.tick_count = header['tick_count']
+        sim.physics_running = True      # Posted updates wait for the tick they were applied at in the capture
+        sim.publish()
+        return sim
+
+    def run_tick(self, applied=0):
+        """
+        Description: Step the physics by one tick, applying the given number of posted updates first
+        """
+        sim = self.sim
+        sim.scheduler.tick_count += 1
+        sim.apply_pending(applied)
+        sim.advance(sim.scheduler.period)
+        self.snaps[sim.tick_count] = sim.published
+        if len(self.snaps) > 256:
+            for tick in [t for t in self.snaps if t < sim.tick_count - 128]:
+                del self.snaps[tick]
+
+    def run_until(self, tick):
+        while self.sim.tick_count < tick:
+            self.run_tick()
+
+    def run(self):
+        """
+        Description: Replay every record of the capture
+        :return: bool (True if every response matched)
+        """
+        sim = self.sim
+        start = time.monotonic_ns()
+        expected = None
+        for kind, tick, ns, payload in self.records:
+            if not self.max_speed:
+                delay = (ns - (time.monotonic_ns() - start)) / 1e9
+                if delay > 0:
+                    time.sleep(delay)
+            if kind == APPLIED:
+                self.run_until(tick - 1)
+                self.run_tick(COUNT.unpack(payload)[0])
+            elif kind == INBOUND:
+                self.run_until(tick)
+                latest, sim.published = sim.published, self.snaps[tick]
+                try:
+                    expected = sim.handle_msg(payload)
+                finally:
+                    sim.published = latest
+                self.requests += 1
+            elif kind == OUTBOUND:
+                if expected == payload:
+                    self.matched += 1
+                else:
+                    self.mismatched += 1
+                    self.mismatches.append((tick, payload, expected))
+                    if self.verbose:
+                        print(f'tick {tick}: captured {payload!r}, replayed {expected!r}')
+                expected = None
+            elif kind == CONTROL:
+                self.run_until(tick)
+                cmd = payload.decode('utf-8').split()
+                if cmd and cmd[0] != 'quit':
+                    self.control.handle(cmd, ('replay', 0))
+                self.controls += 1
+        return self.mismatched == 0
+
+    def report(self, elapsed):
+        captured = self.records[-1][2] / 1e9 if self.records else 0
+        print(f'{self.requests} requests, {self.controls} control commands, {self.sim.tick_count} ticks: '
+              f'{self.matched} responses matched, {self.mismatched} mismatched '
+              f'(replayed {captured:.1f} s of capture in {elapsed:.2f} s)')
+        for tick, captured_resp, replayed in self.mismatches[:10]:
+            print(f'  tick {tick}: captured {captured_resp!r}, replayed {replayed!r}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a captured simulator session and verify the responses')
+    parser.add_argument('capture', help='capture log written by run_simulation(capture=...) / gensim.py --capture')
+    parser.add_argument('--max-speed', action='store_true', help='replay as fast as possible instead of in real time')
+    parser.add_argument('--verbose', action='store_true', help='print every mismatch as it happens')
+    args = parser.parse_args()
+    replayer = Replayer(args.capture, max_speed=args.max_speed, verbose=args.verbose)
+    t = time.perf_counter()
+    ok = replayer.run()
+    replayer.report(time.perf_counter() - t)
+    raise SystemExit(0 if ok else 1)
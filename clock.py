@@ -0,0 +1,51 @@
+import time
+
+
+class SimClock:
+    """
+    Simulation clock. Simulated time starts at the wall-clock time the clock is created and is
+    advanced only by the physics: every tick of dt seconds moves it forward by dt * scale, and
+    step() jumps it forward. With a scale above 1 neutron ramps, run-hour accounting and the
+    auto shut down run faster than real time; step() skips ahead without running the ticks.
+
+    The clock is owned by the physics thread; command handlers change it through GenSimulator.post.
+    """
+    MAX_SCALE = 100000
+
+    def __init__(self, scale=1.0, start=None):
+        """
+        :param scale: float (simulated seconds per wall-clock second of physics)
+        :param start: float (initial simulated time, seconds since the epoch), None for the current time
+        """
+        self.now = time.time() if start is None else start
+        self.scale = scale
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        if not 0 < scale <= self.MAX_SCALE:
+            raise ValueError(f'Clock scale must be > 0 and <= {self.MAX_SCALE} (got {scale})')
+        self._scale = scale
+
+    def tick(self, dt):
+        """
+        Description: Advance the clock by one physics tick
+        :param dt: float (timestep in seconds)
+        :return: float (simulated time after the tick)
+        """
+        self.now += dt * self._scale
+        return self.now
+
+    def step(self, seconds):
+        """
+        Description: Jump the clock forward
+        :param seconds: float
+        :return: n/a
+        :raises ValueError: if seconds is negative
+        """
+        if seconds < 0:
+            raise ValueError('The simulation clock cannot run backwards')
+        self.now += seconds
@@ -0,0 +1,294 @@
+import json
+import math
+import time
+
+
+class ControlPlane:
+    """
+    Simulator control plane. Handles the text commands sent to the gensim.py control listener
+    (debug, flt, null, set, print, get, dump, exec, subscribe, step, clock, stats, scenario, impair,
+    sessions, quit) against a GenSimulator.
+
+    Subscriptions stream a snapshot of the requested attributes to a client at a fixed rate. A
+    subscription lapses after SUBSCRIPTION_LEASE seconds unless the client renews it by sending the
+    subscribe command again, so clients that go away stop being streamed to.
+    """
+    SUBSCRIPTION_LEASE = 10     # seconds
+    USAGE = ('Usage: debug|flt|null|set|print|get|dump|exec|subscribe|step|clock|stats|scenario|impair|sessions|quit '
+             '<opt:args>')
+
+    def __init__(self, sim, send):
+        """
+        :param sim: GenSimulator being controlled
+        :param send: callable(ip, msg) sending a response string to a client
+        """
+        self.sim = sim
+        self.send = send
+        self.subscriptions = {}     # client ip -> [period, next due, lease expiry, attribute names]
+
+    def handle(self, cmd, addr):
+        """
+        Description: Execute one control command
+        :param cmd: list of str (command tokens)
+        :param addr: (ip, port) of the client
+        :return: n/a
+        """
+        if not cmd:
+            return
+        recorder = self.sim.recorder
+        if recorder is not None:
+            recorder.control(self.sim.published.tick_count, cmd)
+        # print(f'Received {cmd} from {addr}')
+        if cmd[0] == 'debug':
+            if cmd[1] == 'on':
+                self.sim.debug = True
+            else:
+                self.sim.debug = False
+        elif cmd[0] == 'flt':
+            if len(cmd) < 2:
+                # Display all fault words
+                resp = (f'Faults = {str.format("0x{:04X}", int(hex(self.sim.fault_1), 16))} '
+                       f'{str.format("0x{:04X}", int(hex(self.sim.fault_2), 16))} '
+                       f'{str.format("0x{:04X}", int(hex(self.sim.fault_3), 16))} '
+                       f'{str.format("0x{:04X}", int(hex(self.sim.fault_4), 16))} '
+                       f'{str.format("0x{:04X}", int(hex(self.sim.fault_5), 16))} '
+                       f'{str.format("0x{:04X}", int(hex(self.sim.fault_6), 16))} ')
+                self.send(addr[0], resp)
+            elif len(cmd) < 3:
+                if cmd[1] == '?':
+                    resp = 'Usage: flt <opt:num> <opt:val>\n Display or set fault values.'
+                else:
+                    # Display a single fault word
+                    attr = f'fault_{cmd[1]}'
+                    word = getattr(self.sim, attr)
+                    resp = f'{str.format("0x{:04X}", int(hex(self.sim.fault_1), 16))}'
+                self.send(addr[0], resp)
+            else:
+                # Set a fault word
+                try:
+                    self.sim.set_attr(f'fault_{cmd[1]}', int(cmd[2], 0))
+                except (AttributeError, ValueError):
+                    self.send(addr[0], 'Usage: flt <opt:num> <opt:val>\n Display or set fault values.')
+
+        elif cmd[0] == 'null':
+            if len(cmd) < 2:
+                cmd.append('?')
+            if cmd[1] == '?' or len(cmd) != 3:
+                resp = (f'null : Command to set a given command response to null for one or more iterations.\n'
+                        'usage: null <cmd> <iterations>. If iterations = -1, repeat forever')
+                self.send(addr[0], resp)
+            else:
+                self.sim.nulls[cmd[1]] = int(cmd[2])
+
+        elif cmd[0] == 'set':
+            parm = cmd[2]
+            try:
+                if parm.find('.') == -1:
+                    val = int(parm)
+                else:
+                    val = float(parm)
+            except ValueError:
+                val = parm
+            try:
+                self.sim.set_attr(cmd[1], val)
+            except (AttributeError, ValueError):
+                resp = 'Usage: set <attribute name> <attribute value>'
+                self.send(addr[0], resp)
+        elif cmd[0] == 'print':
+            try:
+                resp = f'{cmd[1]} = {getattr(self.sim, cmd[1])}'
+                self.send(addr[0], resp)
+            except AttributeError:
+                resp = 'Usage: set <attribute name> <attribute value>'
+                self.send(addr[0], resp)
+        elif cmd[0] == 'quit':
+            raise SystemExit
+        elif cmd[0] == 'exec':
+            try:
+                #rval = eval(f'self.sim.{cmd[1]}()')
+                func = getattr(self.sim, cmd[1])
+                rval = func(*cmd[2:])
+                self.sim.invalidate_cache()
+                resp = f'{cmd[1]} : {rval}'
+                self.send(addr[0], resp)
+            except (AttributeError, TypeError):
+                resp = 'Usage: exec <method name> <opt:args>'
+                self.send(addr[0], resp)
+
+        elif cmd[0] == 'get':
+            try:
+                self.send(addr[0], self.encode_snapshot(self.sim.snapshot(cmd[1:])))
+            except (AttributeError, TypeError, ValueError):
+                self.send(addr[0], 'Usage: get <attribute name> <attribute name> ...')
+        elif cmd[0] == 'dump':
+            self.send(addr[0], self.encode_snapshot(self.sim.snapshot()))
+        elif cmd[0] == 'subscribe':
+            self.subscribe(cmd[1:], addr)
+        elif cmd[0] == 'step':
+            # Jump the simulation clock forward
+            try:
+                seconds = float(cmd[1])
+                if seconds < 0:
+                    raise ValueError
+            except (IndexError, ValueError):
+                self.send(addr[0], 'Usage: step <seconds>  Advance the simulation clock.')
+                return
+            self.sim.post(self.sim.clock.step, seconds)
+        elif cmd[0] == 'clock':
+            clock = self.sim.clock
+            if len(cmd) < 2:
+                self.send(addr[0], f'clock = {clock.now:.3f} scale = {clock.scale}')
+                return
+            try:
+                scale = float(cmd[1])
+                if not 0 < scale <= clock.MAX_SCALE:
+                    raise ValueError
+            except ValueError:
+                self.send(addr[0], f'Usage: clock <opt:scale>  Display the simulation clock or set its speed '
+                                   f'(0 < scale <= {clock.MAX_SCALE}).')
+                return
+            self.sim.post(setattr, clock, 'scale', scale)
+        elif cmd[0] == 'stats':
+            self.stats(cmd[1:], addr)
+        elif cmd[0] == 'scenario':
+            self.scenario(cmd[1:], addr)
+        elif cmd[0] == 'impair':
+            self.impair(cmd[1:], addr)
+        elif cmd[0] == 'sessions':
+            sessions = self.sim.sessions
+            self.send(addr[0], 'Sessions are not tracked' if sessions is None else sessions.status())
+
+    def stats(self, args, addr):
+        """
+        Description: stats <opt:on|off|prom> : display the simulator metrics (see metrics.py), turn the
+        instrumentation on or off, or display the metrics in the Prometheus text format
+        :param args: list of str
+        :param addr: (ip, port) of the client
+        :return: n/a
+        """
+        sim = self.sim
+        if args and args[0] == 'on':
+            sim.enable_metrics()
+            return
+        if args and args[0] == 'off':
+            sim.disable_metrics()
+            return
+        if args and args[0] != 'prom':
+            self.send(addr[0], 'Usage: stats <opt:on|off|prom>  Display the metrics, or turn them on or off.')
+            return
+        metrics = sim.metrics
+        if metrics is None:
+            self.send(addr[0], 'Metrics are disabled, turn them on with "stats on"')
+        elif args:
+            self.send(addr[0], metrics.prometheus(sim, f'tube="{sim.tube_str}"'))
+        else:
+            self.send(addr[0], metrics.summary(sim))
+
+    def scenario(self, args, addr):
+        """
+        Description: scenario <opt:file|stop> : display the progress of the running fault-injection scenario,
+        start the scenario in a JSON/YAML file (see scenario.py) or stop it
+        :param args: list of str
+        :param addr: (ip, port) of the client
+        :return: n/a
+        """
+        from scenario import Scenario
+
+        sim = self.sim
+        if not args:
+            self.send(addr[0], 'No scenario running' if sim.scenario is None else sim.scenario.status())
+        elif args[0] == 'stop':
+            sim.run_scenario(None)
+        else:
+            try:
+                scenario = Scenario.load(args[0])
+            except (OSError, ValueError, ImportError) as e:
+                self.send(addr[0], f'Usage: scenario <opt:file|stop>  Failed to load {args[0]}: {e}')
+                return
+            sim.run_scenario(scenario)
+
+    def impair(self, args, addr):
+        """
+        Description: impair <opt:file|off> : display the counters of the network impairment stage, load its
+        configuration from a JSON/YAML file (see impairment.py) or turn it off
+        :param args: list of str
+        :param addr: (ip, port) of the client
+        :return: n/a
+        """
+        from impairment import Impairment
+
+        sim = self.sim
+        if not args:
+            self.send(addr[0], 'No impairment' if sim.impairment is None else sim.impairment.status())
+        elif args[0] == 'off':
+            sim.impairment = None
+        else:
+            try:
+                sim.impairment = Impairment.load(args[0])
+            except (OSError, ValueError, ImportError) as e:
+                self.send(addr[0], f'Usage: impair <opt:file|off>  Failed to load {args[0]}: {e}')
+
+    @staticmethod
+    def encode_snapshot(snap):
+        """
+        :param snap: dict of attribute name -> value
+        :return: str (compact JSON object, values JSON cannot represent are sent as their str(), like 'print')
+        """
+        return json.dumps(snap, separators=(',', ':'), default=str)
+
+    def subscribe(self, args, addr):
+        """
+        Description: subscribe <rate> <attr...> : stream the attributes to the client rate times per second.
+        A rate of 0 cancels the client's subscription. Rates above the physics tick rate are clamped to it, faster
+        snapshots would only repeat the same state.
+        :param args: list of str (rate followed by attribute names)
+        :param addr: (ip, port) of the client
+        :return: n/a
+        """
+        try:
+            rate = float(args[0])
+            attrs = args[1:]
+            for attr in attrs:
+                getattr(self.sim, attr)
+            if not math.isfinite(rate) or rate < 0:
+                raise ValueError(rate)
+        except (IndexError, ValueError, AttributeError):
+            self.send(addr[0], 'Usage: subscribe <rate> <attribute name> ... (rate 0 to cancel)')
+            return
+        if rate == 0 or not attrs:
+            self.subscriptions.pop(addr[0], None)
+            return
+        rate = min(rate, self.sim.tick_rate)
+        now = time.monotonic()
+        self.subscriptions[addr[0]] = [1 / rate, now, now + self.SUBSCRIPTION_LEASE, attrs]
+
+    def snapshot_msg(self, attrs):
+        """
+        :param attrs: list of str (attribute names)
+        :return: str ('snap name=value name=value ...')
+        """
+        snap = self.sim.snapshot(attrs)
+        return 'snap ' + ' '.join(f'{attr}={val}' for attr, val in snap.items())
+
+    def next_due(self):
+        """
+        :return: float seconds until the next subscription snapshot is due (0 if overdue), None if none
+        """
+        if not self.subscriptions:
+            return None
+        return max(min(sub[1] for sub in self.subscriptions.values()) - time.monotonic(), 0)
+
+    def publish(self):
+        """
+        Description: Send every subscription snapshot that is due and drop lapsed subscriptions
+        :return: n/a
+        """
+        now = time.monotonic()
+        for ip, sub in list(self.subscriptions.items()):
+            period, due, expiry, attrs = sub
+            if now >= expiry:
+                del self.subscriptions[ip]
+            elif now >= due:
+                self.send(ip, self.snapshot_msg(attrs))
+                # Keep the cadence, but don't burst to catch up after a stall
+                sub[1] = max(due + period, now)
@@ -0,0 +1,430 @@
+from collections import deque
+
+import numpy as np
+
+from clock import SimClock
+from scheduler import TickScheduler
+from simulator import GenSimulator, StateSnapshot
+
+
+# Per-unit state held by the fleet, one array per attribute (struct-of-arrays)
+FLEET_FIELDS = (
+    # Telemetry
+    ('accel_current', np.float64),
+    ('accel_voltage', np.float64),
+    ('getter_current', np.float64),
+    ('board_temp', np.float64),
+    ('tube_pres', np.float64),
+    ('tube_temp', np.float64),
+    ('input_emf', np.float64),
+    ('system_state', np.int64),
+    ('fault_1', np.int64),
+    ('fault_2', np.int64),
+    ('fault_3', np.int64),
+    ('fault_4', np.int64),
+    ('fault_5', np.int64),
+    ('fault_6', np.int64),
+    ('run_seconds', np.int64),
+    ('amp_hours', np.int64),
+    # State machine
+    ('faults', np.bool_),
+    ('neutrons_on', np.bool_),
+    ('neutrons_starting', np.bool_),
+    ('neutrons_ramping_up', np.bool_),
+    ('neutrons_ramping_down', np.bool_),
+    ('accel_voltage_ramping', np.bool_),
+    ('neutrons_start_time', np.float64),
+    ('start_time', np.int64),
+    ('run_start_time', np.float64),
+    ('shutdown_time', np.int64),
+    ('orig_seconds', np.int64),
+    # Setpoints
+    ('accel_voltage_sp', np.float64),
+    ('accel_voltage_set', np.float64),
+    ('accel_current_sp', np.float64),
+    ('accel_current_set', np.float64),
+    ('getter_current_sp', np.float64),
+    # Quiescent / transient values
+    ('IDEAL_TUBE_PRES', np.float64),
+    ('IDEAL_TUBE_TEMP', np.float64),
+    ('IDEAL_INPUT_EMF', np.float64),
+    ('IDEAL_BOARD_TEMP', np.float64),
+    ('GETTER_IDLE', np.float64),
+    ('GETTER_RAMP', np.float64),
+    ('GETTER_RUNNING', np.float64),
+    ('ACCEL_VOLTAGE_WARM', np.float64),
+    ('NEUTRONS_RAMP_TIME', np.float64),
+    ('ACCEL_CURRENT_NOISE', np.float64),
+    ('ACCEL_VOLTAGE_NOISE', np.float64),
+    ('GETTER_CURRENT_NOISE', np.float64),
+    ('ENV_NOISE', np.float64),
+)
+
+# Environmental parameters serviced by svc_environment: (setpoint, value)
+ENV_FIELDS = (('IDEAL_BOARD_TEMP', 'board_temp'),
+              ('IDEAL_TUBE_PRES', 'tube_pres'),
+              ('IDEAL_TUBE_TEMP', 'tube_temp'),
+              ('IDEAL_INPUT_EMF', 'input_emf'))
+
+
+def fleet_layout(size):
+    """
+    Description: Layout of the fleet arrays in one contiguous buffer (see GenFleet's buffer argument)
+    :param size: int (number of units)
+    :return: (list of (name, dtype, byte offset), int total size in bytes)
+    """
+    layout = []
+    offset = 0
+    for name, dtype in FLEET_FIELDS:
+        layout.append((name, dtype, offset))
+        offset += -(-size * np.dtype(dtype).itemsize // 8) * 8    # Keep every array 8-byte aligned
+    return layout, offset
+
+
+# Fleet arrays that are part of a member's StateSnapshot
+SNAPSHOT_FIELDS = tuple(name for name, _ in FLEET_FIELDS if name in GenSimulator.STATE_ATTRS)
+
+
+class FleetField:
+    """
+    Descriptor mapping a GenSimulator attribute onto the member's row of a fleet array
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj.fleet, self.name)[obj.row].item()
+
+    def __set__(self, obj, value):
+        getattr(obj.fleet, self.name)[obj.row] = value
+
+
+class FleetGenSimulator(GenSimulator):
+    """
+    Generator simulator whose state lives in one row of a GenFleet. All of the command methods
+    (MAC, MAV, MP, N, Q, ...) are inherited unchanged and read/write the fleet arrays through
+    FleetField descriptors. Physics is stepped for the whole fleet at once by GenFleet.
+    """
+    __slots__ = ('fleet', 'row', '_snapshot')
+
+    def __init__(self, fleet, row, **kwargs):
+        self.fleet = fleet
+        self.row = row
+        self._snapshot = (None, None)    # (fleet publication, StateSnapshot built from it)
+        super().__init__(tick_rate=fleet.scheduler.rate, clock=fleet.clock, **kwargs)
+        self.scheduler = fleet.scheduler
+
+    def run_physics(self, shutdown):
+        """
+        Description: No-op, fleet members are stepped by GenFleet.run_physics
+        :param shutdown: threading.Event
+        :return: n/a
+        """
+        return
+
+    def tick(self, dt):
+        """
+        Description: Fleet members cannot be ticked individually, use GenFleet.step
+        """
+        raise NotImplementedError('Fleet members are stepped by GenFleet.step')
+
+    def post(self, func, *args):
+        """
+        Description: Updates are applied by the fleet physics thread, see GenFleet.post
+        """
+        self.fleet.post(func, *args)
+
+    def publish(self):
+        """
+        Description: No-op, the fleet publishes the state of every member once per step
+        """
+        return
+
+    @property
+    def published(self):
+        """
+        :return: StateSnapshot of this member, built from the fleet's latest publication
+        """
+        pub, snap = self._snapshot
+        fleet_pub = self.fleet.published
+        if pub is not fleet_pub or snap is None:
+            row = self.row
+            snap = StateSnapshot._make(fleet_pub[name][row].item() if name in fleet_pub else getattr(self, name)
+                                       for name in GenSimulator.STATE_ATTRS)
+            self._snapshot = (fleet_pub, snap)
+        return snap
+
+
+for _name, _dtype in FLEET_FIELDS:
+    setattr(FleetGenSimulator, _name, FleetField(_name))
+
+
+class GenFleet:
+    """
+    Vectorized simulation engine for many generators. State for all units is kept in NumPy arrays
+    (one per attribute in FLEET_FIELDS) and the physics for every unit is advanced by a single
+    batched update per tick.
+    """
+    # System states (identical for all generator types)
+    SYSTEM_STATE_FAULTED = GenSimulator.SYSTEM_STATE_FAULTED
+    SYSTEM_STATE_SSHV = GenSimulator.SYSTEM_STATE_SSHV
+    SYSTEM_STATE_IDLE = GenSimulator.SYSTEM_STATE_IDLE
+    SYSTEM_STATE_RUNNING = GenSimulator.SYSTEM_STATE_RUNNING
+    SYSTEM_STATE_SDHV = GenSimulator.SYSTEM_STATE_SDHV
+
+    NOMINAL_TICK_RATE = GenSimulator.NOMINAL_TICK_RATE
+
+    def __init__(self, units, tick_rate=100, seed=None, store=None, clock=None, buffer=None):
+        """
+        :param units: int (number of units) or list of dicts of GenSimulator keyword arguments, one per unit
+        :param tick_rate: physics update rate (Hz)
+        :param seed: seed for the fleet noise generator (None for OS entropy)
+        :param store: persistence.TubeStore shared by every unit (default: the shared store)
+        :param clock: clock.SimClock shared by every unit (default: a real-time clock starting now)
+        :param buffer: writable buffer of at least fleet_layout(len(units))[1] bytes to hold the state arrays (e.g.
+        a multiprocessing.shared_memory block), None to allocate them privately
+        """
+        if isinstance(units, int):
+            units = [{'tube_str': f'SIM{i:04d}'} for i in range(units)]
+        self.size = len(units)
+        self.scheduler = TickScheduler(tick_rate)
+        self.clock = SimClock() if clock is None else clock
+        self.pending = deque()          # Updates posted to the physics thread by the members: (func, args)
+        self.physics_running = False
+        self.exporter = None            # telemetry.TelemetryExporter while telemetry is exported
+        self.rng = np.random.default_rng(seed)
+        if buffer is None:
+            for name, dtype in FLEET_FIELDS:
+                setattr(self, name, np.zeros(self.size, dtype=dtype))
+        else:
+            for name, dtype, offset in fleet_layout(self.size)[0]:
+                setattr(self, name, np.ndarray(self.size, dtype=dtype, buffer=buffer, offset=offset))
+                getattr(self, name)[:] = 0
+        self.publish()
+        self.members = [FleetGenSimulator(self, row, **{'store': store, **kwargs}) for row, kwargs in enumerate(units)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, row):
+        return self.members[row]
+
+    def __iter__(self):
+        return iter(self.members)
+
+    @property
+    def tick_rate(self):
+        return self.scheduler.rate
+
+    @tick_rate.setter
+    def tick_rate(self, hz):
+        self.scheduler.rate = hz
+
+    def run_physics(self, shutdown):
+        """
+        Description: Physics loop. Runs step() for the whole fleet at tick_rate until shutdown is set.
+        :param shutdown: threading.Event
+        :return: n/a
+        """
+        self.physics_running = True
+        try:
+            self.scheduler.run(self.step, shutdown)
+        finally:
+            self.physics_running = False
+
+    def step(self, dt):
+        """
+        Description: Advance every unit of the fleet by one timestep.
+        :param dt: float (timestep in seconds)
+        :return: n/a
+        """
+        k = dt * self.NOMINAL_TICK_RATE
+        self.apply_pending()
+        now = self.clock.tick(dt)
+        self.svc_gen_state(now)
+        self.svc_accel_voltage(k)
+        self.svc_accel_current(k)
+        self.svc_getter_current(k)
+        self.svc_environment(k, now)
+        self.publish()
+
+    post = GenSimulator.post
+    apply_pending = GenSimulator.apply_pending
+
+    def publish(self):
+        """
+        Description: Publish copies of the state arrays read by the members' snapshots (see GenSimulator.publish)
+        :return: n/a
+        """
+        self.published = {name: getattr(self, name).copy() for name in SNAPSHOT_FIELDS}
+        if self.exporter is not None:
+            self.exporter.write_fleet(self, self.scheduler.tick_count, self.clock.now)
+
+    def export_telemetry(self, name):
+        """
+        Description: Publish the live telemetry of every unit (one record per row) to a shared memory block every
+        step (see telemetry.py)
+        :param name: str (shared memory block name)
+        :return: TelemetryExporter
+        """
+        from telemetry import TelemetryExporter
+
+        exporter = TelemetryExporter(name, units=self.size)
+        exporter.write_fleet(self, self.scheduler.tick_count, self.clock.now)
+        self.exporter = exporter
+        print(f'Exporting telemetry for {self.size} units to shared memory block {name}')
+        return exporter
+
+    def check_system_state(self):
+        """
+        Description: Batched GenSimulator.check_system_state
+        """
+        m = (self.fault_1 + self.fault_2 + self.fault_3 + self.fault_4 + self.fault_5 + self.fault_6) > 0
+        self.faults[m] = True
+        self.system_state[m] = self.SYSTEM_STATE_FAULTED
+        for name in ('accel_current', 'accel_current_sp', 'accel_voltage', 'accel_voltage_sp',
+                     'getter_current_sp', 'getter_current'):
+            getattr(self, name)[m] = 0
+
+    def svc_gen_state(self, now):
+        """
+        Description: Batched GenSimulator.svc_gen_state. Each branch of the scalar state machine returns early,
+        so rows are removed from the pending mask once a branch has handled them.
+        :param now: float (simulated time of this step)
+        """
+        self.check_system_state()
+
+        pending = (self.system_state & self.SYSTEM_STATE_FAULTED) != self.SYSTEM_STATE_FAULTED
+        m = ~pending
+        self.neutrons_starting[m] = self.neutrons_ramping_up[m] = self.neutrons_on[m] = False
+
+        m = pending & self.neutrons_starting
+        self.system_state[m] = self.SYSTEM_STATE_SSHV
+        self.getter_current_sp[m] = self.GETTER_RAMP[m]
+        self.accel_voltage_sp[m] = self.ACCEL_VOLTAGE_WARM[m]
+        self.neutrons_start_time[m] = now
+        self.neutrons_starting[m] = False
+        self.neutrons_ramping_up[m] = True
+        pending &= ~m
+
+        m = pending & self.neutrons_ramping_up & ((now - self.neutrons_start_time) > self.NEUTRONS_RAMP_TIME)
+        self.system_state[m] = self.SYSTEM_STATE_RUNNING
+        self.getter_current_sp[m] = self.GETTER_RAMP[m]
+        self.neutrons_ramping_up[m] = False
+        self.neutrons_on[m] = True
+        self.start_time[m] = int(now)
+        self.run_start_time[m] = now
+        pending &= ~m
+
+        m = pending & self.neutrons_on
+        auto = m & (self.shutdown_time > 0) & ((now - self.run_start_time) >= self.shutdown_time)
+        if auto.any():
+            # Auto shut down (SUT), the run ended shutdown_time after it started
+            self.account_run_time((self.run_start_time + self.shutdown_time).astype(np.int64), auto)
+            self.neutrons_ramping_down[auto] = True
+        self.accel_voltage_sp[m] = self.accel_voltage_set[m]
+        self.accel_current_sp[m] = self.accel_current_set[m]
+        self.getter_current_sp[m] = self.GETTER_RUNNING[m]
+        d = m & self.neutrons_ramping_down
+        self.system_state[d] = self.SYSTEM_STATE_SDHV
+        self.getter_current_sp[d] = self.GETTER_IDLE[d]
+        self.accel_voltage_sp[d] = 0
+        self.accel_current_sp[d] = 0
+        self.neutrons_on[d] = False
+        pending &= ~m
+
+        m = pending & self.neutrons_ramping_down & (self.accel_current < 0.5)
+        self.system_state[m] = self.SYSTEM_STATE_IDLE
+        self.neutrons_ramping_down[m] = False
+        pending &= ~m
+
+        m = pending & self.faults
+        self.system_state[m] = self.SYSTEM_STATE_FAULTED
+        pending &= ~m
+
+        m = pending & ~self.neutrons_ramping_up & ~self.neutrons_ramping_down
+        self.system_state[m] = self.SYSTEM_STATE_IDLE
+        self.getter_current_sp[m] = self.GETTER_IDLE[m]
+
+        m = pending & (self.system_state != self.SYSTEM_STATE_RUNNING) & (self.run_seconds != self.orig_seconds)
+        for row in np.flatnonzero(m):
+            self.members[row].save_tube_info()
+
+    @staticmethod
+    def step_toward(value, setpoint, step, wiggle):
+        """
+        Description: Batched GenSimulator.step_toward, updates value in place
+        :param value: float array
+        :param setpoint: float array
+        :param step: float array (change over the timestep, >= 0)
+        :param wiggle: float array (largest excursion past the setpoint)
+        """
+        step = np.minimum(step, np.abs(setpoint - value) + wiggle)
+        value += np.where(value > setpoint, -step, step)
+
+    def svc_accel_current(self, k):
+        """
+        Description: Batched GenSimulator.svc_accel_current
+        :param k: float (step scale, see GenSimulator.step_scale)
+        """
+        noise = self.rng.random(self.size) * self.ACCEL_CURRENT_NOISE
+        self.step_toward(self.accel_current, self.accel_current_sp, noise * k, noise)
+        self.accel_current[(self.accel_current_sp == 0) & (self.accel_current < 5)] = 0
+
+    def svc_accel_voltage(self, k):
+        """
+        Description: Batched GenSimulator.svc_accel_voltage
+        :param k: float (step scale, see GenSimulator.step_scale)
+        """
+        r = self.rng.random(self.size)
+        ramping = self.accel_voltage_ramping.copy()
+        ramp = np.minimum(r * 5 * k, np.maximum(self.accel_voltage_sp - self.accel_voltage, 0) + r * 5)
+        self.accel_voltage[ramping] += ramp[ramping]
+        self.accel_voltage_ramping[ramping & ((self.accel_voltage_sp - self.accel_voltage) < 6)] = False
+        noise = r * self.ACCEL_VOLTAGE_NOISE
+        noise[ramping] = 0
+        self.step_toward(self.accel_voltage, self.accel_voltage_sp, noise * k, noise)
+        self.accel_voltage[(self.accel_voltage_sp == 0) & (self.accel_voltage < 5)] = 0
+
+    def svc_getter_current(self, k):
+        """
+        Description: Batched GenSimulator.svc_getter_current
+        :param k: float (step scale, see GenSimulator.step_scale)
+        """
+        active = self.getter_current_sp != 0
+        running = self.system_state == self.SYSTEM_STATE_RUNNING
+        noise = self.rng.random(self.size) * self.GETTER_CURRENT_NOISE    # Wiggle the value a little
+        settle = np.abs(self.getter_current_sp - self.getter_current) * .001 * k
+        step = np.where(running, noise * k, settle)
+        step[~active] = 0
+        self.step_toward(self.getter_current, self.getter_current_sp, step, np.where(running, noise, 0))
+
+    def svc_environment(self, k, now):
+        """
+        Description: Batched GenSimulator.svc_environment
+        :param k: float (step scale, see GenSimulator.step_scale)
+        :param now: float (simulated time of this step)
+        """
+        for sp_name, name in ENV_FIELDS:
+            sp = getattr(self, sp_name)
+            val = getattr(self, name)
+            update = self.rng.random(self.size) > 1 - 0.2 * k  # Don't update values at every iteration
+            step = self.rng.random(self.size) * self.ENV_NOISE
+            step[~update] = 0
+            val += np.where(val > sp, -step, step)
+
+        self.account_run_time(np.full(self.size, int(now)), np.ones(self.size, dtype=bool))
+
+    def account_run_time(self, now, rows):
+        """
+        Description: Batched GenSimulator.account_run_time
+        :param now: int array (simulated time per unit, seconds)
+        :param rows: bool array (units to update)
+        """
+        m = rows & (self.system_state == self.SYSTEM_STATE_RUNNING) & (now > self.start_time)
+        elapsed = now[m] - self.start_time[m]
+        self.run_seconds[m] += elapsed
+        self.amp_hours[m] += (elapsed * self.accel_current[m]).astype(np.int64)
+        self.start_time[m] = now[m]
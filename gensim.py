@@ -1,4 +1,9 @@
 import simulator
+import bulkio
+from clock import SimClock
+from control import ControlPlane
+import argparse
+import atexit
 import threading
 import socket
 import time
@@ -6,14 +11,58 @@ import time
 myip = '192.168.1.121'
 myport = 6001
 clientport = 6002
+tick_rate = 100     # Physics update rate (Hz)
 
+parser = argparse.ArgumentParser(description='Neutron generator simulation engine')
+parser.add_argument('--rate', type=int, default=tick_rate, help='physics update rate in Hz (default %(default)s)')
+parser.add_argument('--bulk-io', action='store_true', help='serve generator commands with batched datagram I/O')
+parser.add_argument('--seed', type=int, default=None, help='seed for the simulation noise, to replay a run exactly')
+parser.add_argument('--clock-scale', type=float, default=1.0,
+                    help='simulated seconds per real second, to run ramps and run-hour tests faster (default 1)')
+parser.add_argument('--capture', default=None, metavar='FILE',
+                    help='record the session to a capture log, replay it with "python capture.py FILE"')
+parser.add_argument('--telemetry', default=None, metavar='NAME',
+                    help='export live telemetry to this shared memory block, read it with "python telemetry.py NAME"')
+parser.add_argument('--metrics', action='store_true',
+                    help='record command latencies and tick durations, display them with the "stats" control command')
+parser.add_argument('--metrics-file', default=None, metavar='FILE',
+                    help='write the metrics in the Prometheus text format to this file (implies --metrics)')
+parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                    help='serve the metrics in the Prometheus text format over HTTP (implies --metrics)')
+parser.add_argument('--scenario', default=None, metavar='FILE',
+                    help='run a fault-injection scenario (JSON or YAML, see scenario.py) on the simulation clock')
+parser.add_argument('--impair', default=None, metavar='FILE',
+                    help='impair the replies with loss, latency, duplication, reordering and bandwidth caps '
+                         '(JSON or YAML, see impairment.py)')
+parser.add_argument('--sessions', action='store_true',
+                    help='track client sessions, answering retransmitted requests from cache instead of re-executing')
+parser.add_argument('--reply-to-source', action='store_true',
+                    help="reply to each request's source port instead of the fixed client port")
+args = parser.parse_args()
 
-mini = simulator.GenSimulator()
+mini = simulator.GenSimulator(tick_rate=args.rate, seed=args.seed, clock=SimClock(args.clock_scale))
+if args.telemetry:
+    atexit.register(mini.export_telemetry(args.telemetry).close)
+if args.sessions:
+    mini.enable_sessions()
+mini.reply_to_source = args.reply_to_source
+if args.scenario:
+    from scenario import Scenario
+    mini.run_scenario(Scenario.load(args.scenario))
+if args.impair:
+    from impairment import Impairment
+    mini.impairment = Impairment.load(args.impair)
+if args.metrics or args.metrics_file or args.metrics_port:
+    from metrics import MetricsExporter
+    mini.enable_metrics()
+    if args.metrics_file or args.metrics_port:
+        atexit.register(MetricsExporter(mini, path=args.metrics_file, port=args.metrics_port).close)
 
 
 print(f'simulator {mini} info: ip = {mini.gen_ip_num}, tube info = {mini.tube_str}')
 
-sim_thread = threading.Thread(target=mini.run_simulation, name='GeneratorSim', daemon=True)
+sim_thread = threading.Thread(target=mini.run_simulation, kwargs={'bulk_io': args.bulk_io, 'capture': args.capture},
+                              name='GeneratorSim', daemon=True)
 print(f'Firing off thread: {sim_thread}')
 sim_thread.start()
 
@@ -24,82 +73,16 @@ out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 in_sock.bind((myip, myport))
 print(f'Opening port {myport} to socket: {in_sock}')
 
-def send_to_client(addr, msg):
-    out_sock.sendto(msg.encode('utf-8'), (addr, clientport))
+io = bulkio.DatagramBatcher(in_sock, send_sock=out_sock)
 
-while True:
-    data, addr = in_sock.recvfrom(1024)  # BLOCKING READ
-    cmd = data.decode('UTF-8').split()
-    # print(f'Received {cmd} from {addr}')
-    if cmd[0] == 'debug':
-        if cmd[1] == 'on':
-            mini.debug = True
-        else:
-            mini.debug = False
-    elif cmd[0] == 'flt':
-        if len(cmd) < 2:
-            # Display all fault words
-            resp = (f'Faults = {str.format("0x{:04X}", int(hex(mini.fault_1), 16))} '
-                   f'{str.format("0x{:04X}", int(hex(mini.fault_2), 16))} '
-                   f'{str.format("0x{:04X}", int(hex(mini.fault_3), 16))} '
-                   f'{str.format("0x{:04X}", int(hex(mini.fault_4), 16))} '
-                   f'{str.format("0x{:04X}", int(hex(mini.fault_5), 16))} '
-                   f'{str.format("0x{:04X}", int(hex(mini.fault_6), 16))} ')
-            send_to_client(addr[0], resp)
-        elif len(cmd) < 3:
-            if cmd[1] == '?':
-                resp = 'Usage: flt <opt:num> <opt:val>\n Display or set fault values.'
-            else:
-                # Display a single fault word
-                attr = f'fault_{cmd[1]}'
-                word = getattr(mini, attr)
-                resp = f'{str.format("0x{:04X}", int(hex(mini.fault_1), 16))}'
-            send_to_client(addr[0], resp)
-        else:
-            # Set a fault word
-            setattr(mini, f'fault_{cmd[1]}', int(cmd[2], 0))
+def send_to_client(addr, msg):
+    io.queue(msg.encode('utf-8'), (addr, clientport))
 
-    elif cmd[0] == 'null':
-        if len(cmd) < 2:
-            cmd.append('?')
-        if cmd[1] == '?' or len(cmd) != 3:
-            resp = (f'null : Command to set a given command response to null for one or more iterations.\n'
-                    'usage: null <cmd> <iterations>. If iterations = -1, repeat forever')
-            send_to_client(addr[0], resp)
-        else:
-            mini.nulls[cmd[1]] = int(cmd[2])
+control = ControlPlane(mini, send_to_client)
 
-    elif cmd[0] == 'set':
-        parm = cmd[2]
-        try:
-            if parm.find('.') == -1:
-                val = int(parm)
-            else:
-                val = float(parm)
-        except ValueError:
-            val = parm
-        try:
-            setattr(mini, cmd[1], val)
-        except AttributeError:
-            resp = 'Usage: set <attribute name> <attribute value>'
-            send_to_client(addr[0], resp)
-    elif cmd[0] == 'print':
-        try:
-            resp = f'{cmd[1]} = {getattr(mini, cmd[1])}'
-            send_to_client(addr[0], resp)
-        except AttributeError:
-            resp = 'Usage: set <attribute name> <attribute value>'
-            send_to_client(addr[0], resp)
-    elif cmd[0] == 'quit':
-        exit()
-    elif cmd[0] == 'exec':
-        try:
-            #rval = eval(f'mini.{cmd[1]}()')
-            func = getattr(mini, cmd[1])
-            rval = func()
-            resp = f'{cmd[1]} : {rval}'
-            send_to_client(addr[0], resp)
-        except AttributeError:
-            resp = 'Usage: exec <method name>'
-            send_to_client(addr[0], resp)
-    cmd = None
+while True:
+    io.wait(control.next_due())   # BLOCKING WAIT (until a command arrives or a subscription is due)
+    for data, addr in io.drain():
+        control.handle(bytes(data).decode('UTF-8').split(), addr)
+    control.publish()
+    io.flush()
@@ -0,0 +1,197 @@
+import argparse
+import random
+import time
+
+from protocol import request_tokens
+from scenario import load_config, parse_rate, parse_seconds
+
+
+def make_latency(spec, rng):
+    """
+    Description: Build a latency sampler
+    :param spec: seconds (constant), or dict with "dist" and its parameters:
+        {"dist": "constant", "value": "20ms"}
+        {"dist": "uniform", "min": "5ms", "max": "50ms"}
+        {"dist": "normal", "mean": "20ms", "sd": "5ms"}         (negative samples are clipped to 0)
+        {"dist": "exponential", "mean": "20ms"}
+        {"dist": "pareto", "scale": "5ms", "alpha": 1.5}        (heavy tail, never below scale)
+    :param rng: random.Random
+    :return: callable() returning float seconds
+    :raises ValueError: if the distribution is unknown
+    """
+    if not isinstance(spec, dict):
+        value = parse_seconds(spec)
+        return lambda: value
+    dist = spec.get('dist', 'constant')
+    if dist == 'constant':
+        value = parse_seconds(spec['value'])
+        return lambda: value
+    if dist == 'uniform':
+        low, high = parse_seconds(spec['min']), parse_seconds(spec['max'])
+        return lambda: rng.uniform(low, high)
+    if dist == 'normal':
+        mean, sd = parse_seconds(spec['mean']), parse_seconds(spec['sd'])
+        return lambda: max(0.0, rng.gauss(mean, sd))
+    if dist == 'exponential':
+        rate = 1 / parse_seconds(spec['mean'])
+        return lambda: rng.expovariate(rate)
+    if dist == 'pareto':
+        scale, alpha = parse_seconds(spec['scale']), float(spec['alpha'])
+        return lambda: scale * rng.paretovariate(alpha)
+    raise ValueError(f'Unknown latency distribution {dist}')
+
+
+class Profile:
+    """
+    Impairments applied to the replies to the requests it matches: by client address and/or by the
+    commands the request carries (a profile with neither matches every request).
+
+        {"clients": ["10.0.0.5"], "commands": ["MP"],
+         "latency": {"dist": "normal", "mean": "20ms", "sd": "5ms"},
+         "loss": "1%", "duplicate": "0.5%", "reorder": "2%", "reorder_delay": "30ms",
+         "bandwidth": 9600, "queue": 4096}
+
+    Replies picked for reordering are held an extra reorder_delay so the following replies overtake
+    them. bandwidth (bytes per second) serializes the replies to each client over a simulated link;
+    a reply that would grow the link backlog beyond queue bytes is dropped.
+    """
+    __slots__ = ('clients', 'commands', 'latency', 'loss', 'duplicate', 'reorder', 'reorder_delay',
+                 'bandwidth', 'queue', 'links', 'replies', 'lost', 'duplicated', 'reordered', 'overflowed')
+
+    def __init__(self, spec, rng):
+        clients = spec.get('clients')
+        self.clients = frozenset(clients) if clients else None
+        commands = spec.get('commands')
+        self.commands = frozenset(c.encode('utf-8') for c in commands) if commands else None
+        self.latency = make_latency(spec['latency'], rng) if 'latency' in spec else None
+        self.loss = parse_rate(spec.get('loss', 0))
+        self.duplicate = parse_rate(spec.get('duplicate', 0))
+        self.reorder = parse_rate(spec.get('reorder', 0))
+        self.reorder_delay = parse_seconds(spec.get('reorder_delay', '10ms'))
+        self.bandwidth = float(spec['bandwidth']) if 'bandwidth' in spec else None
+        self.queue = int(spec['queue']) if 'queue' in spec else None
+        self.links = {}         # client ip -> monotonic time the simulated link is free
+        self.replies = self.lost = self.duplicated = self.reordered = self.overflowed = 0
+
+    def __str__(self):
+        match = []
+        if self.clients:
+            match.append(f'clients {",".join(sorted(self.clients))}')
+        if self.commands:
+            match.append(f'commands {b",".join(sorted(self.commands)).decode("utf-8")}')
+        return (f'{" ".join(match) or "all requests"}: {self.replies} replies, {self.lost} lost, '
+                f'{self.duplicated} duplicated, {self.reordered} reordered, {self.overflowed} queue drops')
+
+
+class Impairment:
+    """
+    Network impairment stage between the execution of a request and the sending of its reply. For
+    each reply the first matching profile (see Profile) decides whether it is lost or duplicated
+    and when each copy leaves: latency sample, reordering hold and bandwidth serialization come on
+    top of the simulator's response_delay.
+
+    The stage only computes send delays. The delayed replies are held by the command server's
+    timer heap (the event loop's call_later, or the bulk I/O server's DatagramBatcher), so any
+    number of them can be in flight without a thread each and without blocking reception.
+    Delays are wall-clock time, the simulation clock does not affect the network.
+    """
+    def __init__(self, spec):
+        """
+        :param spec: dict {"seed": ..., "profiles": [profile, ...]}
+        :raises ValueError: if the configuration is not valid
+        """
+        self.seed = spec.get('seed')
+        self.rng = random.Random(self.seed)
+        try:
+            self.profiles = [Profile(p, self.rng) for p in spec.get('profiles', [])]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid impairment profile: {e!r}') from e
+        self.by_command = any(p.commands is not None for p in self.profiles)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Description: Load an impairment configuration from a JSON file, or a YAML file (.yaml/.yml, requires PyYAML)
+        :param path: str
+        :return: Impairment
+        """
+        return cls(load_config(path))
+
+    def match(self, data, ip):
+        """
+        :param data: bytes-like (request datagram)
+        :param ip: str (client address)
+        :return: Profile, None if no profile matches
+        """
+        tokens = request_tokens(data) if self.by_command else None
+        for profile in self.profiles:
+            if profile.clients is not None and ip not in profile.clients:
+                continue
+            if profile.commands is not None and profile.commands.isdisjoint(tokens):
+                continue
+            return profile
+        return None
+
+    def apply(self, data, resp, ip, delay):
+        """
+        Description: Impair one reply
+        :param data: bytes-like (request datagram)
+        :param resp: bytes (response datagram)
+        :param ip: str (client address)
+        :param delay: float (seconds the reply is held before it is sent, without impairment)
+        :return: list of (bytes, float) copies of the reply to send and their delays, empty if the reply is lost
+        """
+        profile = self.match(data, ip)
+        if profile is None:
+            return [(resp, delay)]
+        profile.replies += 1
+        rng = self.rng.random
+        if profile.loss and rng() < profile.loss:
+            profile.lost += 1
+            return []
+        copies = 1
+        if profile.duplicate and rng() < profile.duplicate:
+            profile.duplicated += 1
+            copies = 2
+        sends = []
+        for _ in range(copies):
+            d = delay
+            if profile.latency is not None:
+                d += profile.latency()
+            if profile.reorder and rng() < profile.reorder:
+                profile.reordered += 1
+                d += profile.reorder_delay
+            if profile.bandwidth is not None:
+                # Serialize over the client's link: the copy leaves once the link has sent everything before it
+                now = time.monotonic()
+                free = max(profile.links.get(ip, now), now + d)
+                if profile.queue is not None and (free - now - d) * profile.bandwidth + len(resp) > profile.queue:
+                    profile.overflowed += 1
+                    continue
+                free += len(resp) / profile.bandwidth
+                profile.links[ip] = free
+                d = free - now
+            sends.append((resp, d))
+        return sends
+
+    def status(self):
+        """
+        :return: str (counters of every profile, for the 'impair' control command)
+        """
+        return '\n'.join(f'profile {n}: {profile}' for n, profile in enumerate(self.profiles)) or 'No profiles'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a network impairment configuration')
+    parser.add_argument('config', help='JSON or YAML impairment configuration')
+    parser.add_argument('--samples', type=int, default=10000, help='replies to simulate (default %(default)s)')
+    args = parser.parse_args()
+    impairment = Impairment.load(args.config)
+    for n, profile in enumerate(impairment.profiles):
+        ip = next(iter(profile.clients)) if profile.clients else '127.0.0.1'
+        request = b'$a ' + b' '.join(profile.commands or [b'MAC']) + b'#'
+        delays = sorted(d for _ in range(args.samples) for _, d in impairment.apply(request, b'a 0#00\r', ip, 0))
+        if delays:
+            print(f'profile {n}: delay p50 {delays[len(delays) // 2] * 1000:.1f} ms, '
+                  f'p99 {delays[int(len(delays) * 0.99)] * 1000:.1f} ms')
+        print(f'profile {n}: {profile}')
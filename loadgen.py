@@ -0,0 +1,193 @@
+import argparse
+import collections
+import socket
+import string
+import threading
+import time
+
+import protocol
+from bulkio import DatagramBatcher
+
+SEQ_CHARS = string.ascii_lowercase
+
+
+class LoadGenerator:
+    """
+    Load generator speaking the generator protocol ('$x CMD CMD ...#') from many pseudo-clients.
+
+    Each pseudo-client is its own UDP socket (its own source port); replies arrive on the reply port
+    (the simulator's gen_out_port). Every request carries a sequence character and replies are matched
+    to the oldest outstanding request with the same character. A reply with a bad checksum or for a
+    sequence character with nothing outstanding counts as mismatched; a request without a reply after
+    timeout seconds counts as lost.
+
+    Modes:
+        open   - send at a fixed rate regardless of replies (latency under a given offered load)
+        closed - keep a fixed number of requests in flight (maximum sustainable throughput)
+    """
+    def __init__(self, host='127.0.0.1', port=55556, reply_port=55555, clients=4, commands=('MAC', 'MAV', 'MP'),
+                 timeout=1.0):
+        self.target = (host, port)
+        self.timeout = timeout
+        self.commands = ' '.join(commands).encode('ascii')
+        self.clients = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(clients)]
+        rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rx.bind((host, reply_port))
+        self.io = DatagramBatcher(rx, ring_size=256)
+        self.outstanding = {c.encode('ascii'): collections.deque() for c in SEQ_CHARS}
+        self.in_flight = 0
+        self._next_seq = 0
+        self._next_client = 0
+        self.sent = self.received = self.lost = self.mismatched = 0
+        self.latencies = []     # ns
+
+    def send_one(self):
+        seq = SEQ_CHARS[self._next_seq]
+        self._next_seq = (self._next_seq + 1) % len(SEQ_CHARS)
+        client = self.clients[self._next_client]
+        self._next_client = (self._next_client + 1) % len(self.clients)
+        self.outstanding[seq.encode('ascii')].append(time.perf_counter_ns())
+        client.sendto(b'$%s %s#' % (seq.encode('ascii'), self.commands), self.target)
+        self.sent += 1
+        self.in_flight += 1
+
+    def collect(self):
+        """
+        Description: Match every reply currently readable to its request
+        :return: n/a
+        """
+        now = time.perf_counter_ns()
+        for data, _ in self.io.drain():
+            body, sep, tail = bytes(data).rpartition(b'#')
+            pending = self.outstanding.get(body[:1])
+            if not sep or not pending or tail[:2] != b'%02X' % protocol.checksum(body):
+                self.mismatched += 1
+                continue
+            self.latencies.append(now - pending.popleft())
+            self.received += 1
+            self.in_flight -= 1
+
+    def expire(self):
+        """
+        Description: Count requests older than timeout as lost
+        :return: n/a
+        """
+        limit = time.perf_counter_ns() - int(self.timeout * 1e9)
+        for pending in self.outstanding.values():
+            while pending and pending[0] < limit:
+                pending.popleft()
+                self.lost += 1
+                self.in_flight -= 1
+
+    def run_open(self, rate, duration):
+        """
+        Description: Offer requests at a fixed rate for duration seconds, then wait for stragglers
+        :param rate: float requests per second
+        :param duration: float seconds
+        :return: n/a
+        """
+        t0 = time.perf_counter()
+        total = int(rate * duration)
+        while self.sent < total:
+            due = t0 + self.sent / rate
+            now = time.perf_counter()
+            while self.sent < total and due <= now:
+                self.send_one()
+                due = t0 + self.sent / rate
+            if self.io.wait(max(due - time.perf_counter(), 0)):
+                self.collect()
+            self.expire()
+        self.drain_remaining()
+
+    def run_closed(self, inflight, duration):
+        """
+        Description: Keep inflight requests outstanding for duration seconds, then wait for stragglers
+        :param inflight: int (at most the number of sequence characters, 26)
+        :param duration: float seconds
+        :return: n/a
+        """
+        inflight = min(inflight, len(SEQ_CHARS))
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            while self.in_flight < inflight:
+                self.send_one()
+            if self.io.wait(0.05):
+                self.collect()
+            self.expire()
+        self.drain_remaining()
+
+    def drain_remaining(self):
+        end = time.perf_counter() + self.timeout
+        while self.in_flight > 0 and time.perf_counter() < end:
+            if self.io.wait(0.05):
+                self.collect()
+        self.expire()
+        self.lost += self.in_flight
+        self.in_flight = 0
+
+    def histogram(self):
+        """
+        :return: list of (upper bound in microseconds, count) for power-of-two latency buckets
+        """
+        buckets = collections.Counter(max(int(ns // 1000), 1).bit_length() for ns in self.latencies)
+        return [(1 << b, buckets[b]) for b in range(min(buckets), max(buckets) + 1)] if buckets else []
+
+    def report(self, elapsed):
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] / 1000 if ordered else 0
+
+        print(f'sent {self.sent}  received {self.received}  lost {self.lost}  mismatched {self.mismatched}  '
+              f'({self.received / elapsed:.0f} replies/s over {elapsed:.1f} s)')
+        print(f'latency us: p50 {pct(50):.0f}  p90 {pct(90):.0f}  p99 {pct(99):.0f}  max {pct(100):.0f}')
+        hist = self.histogram()
+        peak = max((n for _, n in hist), default=0)
+        for bound, n in hist:
+            print(f'  < {bound:8d} us {n:9d} {"#" * (50 * n // peak if peak else 0)}')
+
+
+def spawn_simulator(mode, port, reply_port):
+    """
+    Description: Start a simulator on loopback in this process to run the load against
+    :param mode: 'asyncio' or 'bulk'
+    :return: GenSimulator
+    """
+    import simulator
+    from persistence import TubeStore
+
+    # In-memory tube store, so the throwaway target never writes tube_info.json
+    sim = simulator.GenSimulator(tube_str='LOADGEN', gen_ip_num='127.0.0.1', store=TubeStore(path=None))
+    sim.gen_inp_port = port
+    sim.gen_out_port = reply_port
+    sim.response_delay = 0
+    threading.Thread(target=sim.run_simulation, kwargs={'bulk_io': mode == 'bulk'}, name='LoadgenTarget',
+                     daemon=True).start()
+    time.sleep(0.5)     # Let the simulator bind
+    return sim
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load generator for the generator UDP protocol')
+    parser.add_argument('--host', default='127.0.0.1', help='simulator address (default %(default)s)')
+    parser.add_argument('--port', type=int, default=55556, help='simulator command port (default %(default)s)')
+    parser.add_argument('--reply-port', type=int, default=55555, help='port replies are sent to (default %(default)s)')
+    parser.add_argument('--mode', choices=('open', 'closed'), default='closed')
+    parser.add_argument('--rate', type=float, default=1000, help='open loop: requests per second')
+    parser.add_argument('--inflight', type=int, default=16, help='closed loop: requests kept in flight (max 26)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load (default %(default)s)')
+    parser.add_argument('--clients', type=int, default=4, help='number of pseudo-clients (source ports)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds before a request counts as lost')
+    parser.add_argument('--cmds', default='MAC MAV MP', help='commands sent in each request (default "%(default)s")')
+    parser.add_argument('--spawn', choices=('asyncio', 'bulk'), help='run a simulator on loopback in this process')
+    args = parser.parse_args()
+
+    if args.spawn:
+        spawn_simulator(args.spawn, args.port, args.reply_port)
+    gen = LoadGenerator(args.host, args.port, args.reply_port, args.clients, args.cmds.split(), args.timeout)
+    start = time.perf_counter()
+    if args.mode == 'open':
+        gen.run_open(args.rate, args.duration)
+    else:
+        gen.run_closed(args.inflight, args.duration)
+    gen.report(time.perf_counter() - start)
@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+
+# Histogram buckets: powers of two from 1.024 us (2**10 ns) to ~1.07 s (2**30 ns), plus +Inf
+MIN_EXP = 10
+MAX_EXP = 30
+BOUNDS_NS = [1 << e for e in range(MIN_EXP, MAX_EXP + 1)]
+
+
+class Histogram:
+    """
+    Latency histogram with fixed power-of-two buckets. Observing a value is a bit_length() and a
+    list increment, no allocation.
+    """
+    __slots__ = ('counts', 'count', 'sum_ns', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS_NS) + 1)     # Last bucket is +Inf
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def observe(self, ns):
+        """
+        :param ns: int (nanoseconds)
+        """
+        b = ns.bit_length() - MIN_EXP
+        self.counts[0 if b < 0 else b if b <= MAX_EXP - MIN_EXP else -1] += 1
+        self.count += 1
+        self.sum_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def quantile(self, q):
+        """
+        :param q: float (0 to 1)
+        :return: int (upper bound in ns of the bucket holding the q quantile, at most max_ns)
+        """
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BOUNDS_NS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max_ns)
+        return self.max_ns
+
+    @property
+    def mean_ns(self):
+        return self.sum_ns / self.count if self.count else 0
+
+
+class Metrics:
+    """
+    Hot-path instrumentation of one simulator: a latency histogram per command mnemonic (exec_func),
+    packet and byte counters for the command socket (handle_msg), reply queue depth, and tick
+    duration / overrun counts for the physics loop.
+
+    Instrumentation is only active while GenSimulator.metrics is set (see enable_metrics); when it is
+    None the hot paths skip it with a single attribute test.
+    """
+    def __init__(self, period=None):
+        """
+        :param period: float (physics tick period in seconds, ticks that take longer count as overruns)
+        """
+        self.started = time.time()
+        self.period_ns = int(period * 1e9) if period else 0
+        self.commands = {}          # mnemonic -> Histogram
+        self.unknown_commands = 0
+        self.nulled_commands = 0
+        self.packets_in = 0
+        self.packets_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.malformed = 0
+        self.reply_queue = 0        # Replies waiting for response_delay
+        self.tick = Histogram()
+        self.overruns = 0
+        self.drains = 0             # Bulk I/O passes that received datagrams
+        self.drained = 0            # Datagrams received by those passes
+        self.full_drains = 0        # Passes that filled the receive ring, so more datagrams were left queued
+
+    def command(self, cmd, ns):
+        hist = self.commands.get(cmd)
+        if hist is None:
+            hist = self.commands[cmd] = Histogram()
+        hist.observe(ns)
+
+    def tick_done(self, ns):
+        """
+        :param ns: int (duration of a physics tick in nanoseconds)
+        """
+        self.tick.observe(ns)
+        if ns > self.period_ns:
+            self.overruns += 1
+
+    def drain(self, count, full):
+        """
+        :param count: int (datagrams received by one DatagramBatcher pass)
+        :param full: bool (the pass filled the receive ring)
+        """
+        if count:
+            self.drains += 1
+            self.drained += count
+            if full:
+                self.full_drains += 1
+
+    def summary(self, sim=None):
+        """
+        :param sim: GenSimulator (adds the scheduler counters), optional
+        :return: str (human readable report for the 'stats' control command)
+        """
+        lines = [f'uptime {time.time() - self.started:.0f} s  packets in {self.packets_in} out {self.packets_out}  '
+                 f'bytes in {self.bytes_in} out {self.bytes_out}  malformed {self.malformed}  '
+                 f'reply queue {self.reply_queue}',
+                 f'bulk drains {self.drains}  mean batch {self.drained / self.drains if self.drains else 0:.1f}  '
+                 f'full {self.full_drains}']
+        t = self.tick
+        lines.append(f'ticks {t.count}  mean {t.mean_ns / 1000:.1f} us  p99 <{t.quantile(0.99) / 1000:.0f} us  '
+                     f'max {t.max_ns / 1000:.0f} us  overruns {self.overruns}' +
+                     (f'  missed {sim.missed_ticks}' if sim is not None else ''))
+        lines.append(f'commands: unknown {self.unknown_commands}  nulled {self.nulled_commands}')
+        for cmd, h in sorted(self.commands.items(), key=lambda item: -item[1].count):
+            lines.append(f'  {cmd:6s} {h.count:9d}  mean {h.mean_ns / 1000:8.1f} us  '
+                         f'p50 <{h.quantile(0.5) / 1000:.0f} us  p99 <{h.quantile(0.99) / 1000:.0f} us')
+        return '\n'.join(lines)
+
+    def prometheus(self, sim=None, labels=''):
+        """
+        :param sim: GenSimulator (adds the scheduler counters), optional
+        :param labels: str (extra labels for every sample, e.g. 'tube="235DT"')
+        :return: str (Prometheus text exposition format)
+        """
+        out = []
+
+        def lbl(*parts):
+            parts = [p for p in parts if p]
+            return '{' + ','.join(parts) + '}' if parts else ''
+
+        def counter(name, value, help_text, kind='counter'):
+            out.append(f'# HELP gensim_{name} {help_text}')
+            out.append(f'# TYPE gensim_{name} {kind}')
+            out.append(f'gensim_{name}{lbl(labels)} {value}')
+
+        def histogram(name, hist, extra=''):
+            cumulative = 0
+            for bound, n in zip(BOUNDS_NS, hist.counts):
+                cumulative += n
+                le = 'le="%g"' % (bound / 1e9)
+                out.append(f'gensim_{name}_bucket{lbl(labels, extra, le)} {cumulative}')
+            le = 'le="+Inf"'
+            out.append(f'gensim_{name}_bucket{lbl(labels, extra, le)} {hist.count}')
+            out.append(f'gensim_{name}_sum{lbl(labels, extra)} {hist.sum_ns / 1e9:.9f}')
+            out.append(f'gensim_{name}_count{lbl(labels, extra)} {hist.count}')
+
+        counter('packets_in_total', self.packets_in, 'Command datagrams received')
+        counter('packets_out_total', self.packets_out, 'Response datagrams sent')
+        counter('bytes_in_total', self.bytes_in, 'Command bytes received')
+        counter('bytes_out_total', self.bytes_out, 'Response bytes sent')
+        counter('malformed_total', self.malformed, 'Command datagrams that could not be parsed')
+        counter('unknown_commands_total', self.unknown_commands, 'Unknown command mnemonics')
+        counter('nulled_commands_total', self.nulled_commands, 'Commands answered with a null response')
+        counter('reply_queue', self.reply_queue, 'Replies waiting for the response delay', 'gauge')
+        counter('drains_total', self.drains, 'Bulk I/O passes that received command datagrams')
+        counter('drained_datagrams_total', self.drained, 'Command datagrams received by bulk I/O passes')
+        counter('full_drains_total', self.full_drains, 'Bulk I/O passes that filled the receive ring (backlog)')
+        counter('tick_overruns_total', self.overruns, 'Physics ticks that took longer than the tick period')
+        if sim is not None:
+            counter('missed_ticks_total', sim.missed_ticks, 'Physics ticks skipped by the scheduler')
+        out.append('# HELP gensim_tick_seconds Physics tick duration')
+        out.append('# TYPE gensim_tick_seconds histogram')
+        histogram('tick_seconds', self.tick)
+        out.append('# HELP gensim_command_seconds Command execution time per mnemonic')
+        out.append('# TYPE gensim_command_seconds histogram')
+        for cmd, hist in sorted(self.commands.items()):
+            histogram('command_seconds', hist, f'cmd="{cmd}"')
+        return '\n'.join(out) + '\n'
+
+
+class MetricsExporter:
+    """
+    Publishes a simulator's metrics in the Prometheus text format: rewritten to a file every interval
+    seconds (atomically, for the node exporter textfile collector) and/or served over HTTP on a port.
+    """
+    def __init__(self, sim, path=None, port=None, interval=5.0, host='127.0.0.1'):
+        """
+        :param sim: GenSimulator with metrics enabled
+        :param path: str (file to write), None for no file
+        :param port: int (HTTP port to serve /metrics on), None for no server
+        :param interval: float seconds between file writes
+        :param host: str (HTTP server address)
+        """
+        self.sim = sim
+        self.metrics = sim.metrics  # Last metrics seen, still exported after 'stats off'
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.server = None
+        if path is not None:
+            threading.Thread(target=self.run_writer, name='MetricsWriter', daemon=True).start()
+        if port is not None:
+            self.serve(host, port)
+
+    def text(self):
+        """
+        :return: str (Prometheus text of the simulator's metrics, the last values seen while they are disabled)
+        """
+        sim = self.sim
+        if sim.metrics is not None:
+            self.metrics = sim.metrics
+        if self.metrics is None:
+            return ''
+        return self.metrics.prometheus(sim, f'tube="{sim.tube_str}"')
+
+    def write(self):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.text())
+        os.replace(tmp, self.path)
+
+    def run_writer(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f'Metrics: failed to write {self.path}: {e}')
+
+    def serve(self, host, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True).start()
+
+    def close(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.path is not None:
+            self.write()
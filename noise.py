@@ -0,0 +1,37 @@
+import random
+from array import array
+
+
+class NoiseSource:
+    """
+    Seeded source of uniform [0, 1) noise samples. Samples are generated a block at a time into an
+    array and handed out one by one, so drawing a sample costs no syscalls or reseeding. Two sources
+    built with the same seed produce the same sequence.
+    """
+    def __init__(self, seed=None, block_size=4096):
+        """
+        :param seed: int seed, None to seed once from OS entropy
+        :param block_size: number of samples generated per refill
+        """
+        self.seed = seed
+        self.block_size = block_size
+        self.rng = random.Random(seed)
+        self._samples = iter(())    # First block is generated on first use
+
+    def refill(self):
+        """
+        Description: Generate the next block of samples
+        :return: n/a
+        """
+        r = self.rng.random
+        self._samples = iter(array('d', [r() for _ in range(self.block_size)]))
+
+    def sample(self):
+        """
+        :return: float in [0, 1)
+        """
+        try:
+            return next(self._samples)
+        except StopIteration:
+            self.refill()
+            return next(self._samples)
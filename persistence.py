@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import threading
+
+DEFAULT_STORE_PATH = 'tube_info.json'
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+class TubeStore:
+    """
+    Shared store of tube run seconds and amp hours, kept in one JSON file for every tube:
+
+        {"version": 1, "tubes": {"235DT": {"run_seconds": 3600, "amp_hours": 2}, ...}}
+
+    update() only records the new values in memory and wakes the writer thread, so it never blocks
+    the physics on file I/O. The writer coalesces every update made within flush_interval into one
+    write, and writes atomically (temporary file + rename) so a crash never leaves a partial file.
+    The store is flushed on close() and at interpreter exit.
+
+    Tubes not in the store are migrated from legacy {tube_str}_info.txt files when first loaded.
+    A store with no path keeps the records in memory only (replay, benchmarks).
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH, flush_interval=1.0):
+        """
+        :param path: str (store file), None for an in-memory store
+        :param flush_interval: float seconds over which updates are coalesced into one write
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = {}           # tube_str -> (run_seconds, amp_hours)
+        self.lock = threading.Lock()
+        self.dirty = threading.Event()     # Records changed since the last write
+        self.wake = threading.Event()      # Wakes the writer thread
+        self.closed = threading.Event()
+        self.writer = None
+        self.writes = 0
+        if path is None:
+            return
+        try:
+            with open(path, 'r') as f:
+                tubes = json.load(f).get('tubes', {})
+            self.records = {tube: (int(rec['run_seconds']), int(rec['amp_hours'])) for tube, rec in tubes.items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f'Tube store {path} is unreadable ({e}), starting empty')
+        atexit.register(self.close)
+
+    def load(self, tube_str):
+        """
+        Description: Read the stored values for a tube, migrating a legacy {tube_str}_info.txt if needed
+        :param tube_str: str
+        :return: (run_seconds, amp_hours), None if the tube is unknown
+        """
+        with self.lock:
+            rec = self.records.get(tube_str)
+        if rec is not None or self.path is None:
+            return rec
+        try:
+            with open(f'{tube_str}_info.txt', 'r') as f:
+                nfo = f.readline().split()
+            rec = (int(nfo[0]), int(nfo[1]))
+        except (FileNotFoundError, IndexError, ValueError):
+            return None
+        self.update(tube_str, *rec)
+        return rec
+
+    def update(self, tube_str, run_seconds, amp_hours):
+        """
+        Description: Record new values for a tube. Never blocks on I/O, the values are written by the writer thread.
+        :return: n/a
+        """
+        with self.lock:
+            self.records[tube_str] = (run_seconds, amp_hours)
+        if self.path is None:
+            return
+        if self.writer is None and not self.closed.is_set():
+            self.start()
+        self.dirty.set()
+        self.wake.set()
+
+    def start(self):
+        """
+        Description: Start the writer thread
+        :return: n/a
+        """
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run_writer, name='TubeStoreWriter', daemon=True)
+                self.writer.start()
+
+    def run_writer(self):
+        while not self.closed.is_set():
+            self.wake.wait()
+            self.wake.clear()
+            if self.closed.wait(self.flush_interval):   # Let updates accumulate, close() does the final flush
+                break
+            self.flush()
+
+    def flush(self):
+        """
+        Description: Write the store if anything changed since the last write
+        :return: bool (True if the file was written)
+        """
+        if not self.dirty.is_set():
+            return False
+        self.dirty.clear()
+        with self.lock:
+            tubes = {tube: {'run_seconds': rs, 'amp_hours': ah} for tube, (rs, ah) in self.records.items()}
+        tmp = f'{self.path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'version': 1, 'tubes': tubes}, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f'Tube store: failed to write {self.path}: {e}')
+            self.dirty.set()
+            return False
+        self.writes += 1
+        return True
+
+    def close(self):
+        """
+        Description: Stop the writer thread and write any pending updates
+        :return: n/a
+        """
+        self.closed.set()
+        self.wake.set()
+        if self.writer is not None and self.writer is not threading.current_thread():
+            self.writer.join()
+        self.flush()
+
+
+def default_store():
+    """
+    :return: TubeStore shared by every simulator that is not given a store of its own
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = TubeStore()
+        return _default_store
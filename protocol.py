@@ -0,0 +1,51 @@
+import re
+
+# Request framing: '$' + sequence character + commands + '#'. Equivalent to the lazy '\$[a-z](.+?)#'
+# (up to the first '#' after at least one character) without the backtracking.
+REQUEST_PATTERN = re.compile(rb'\$([a-z])(.[^#\n]*)#')
+
+
+def checksum(data):
+    """
+    Description: Protocol checksum, the one's complement of the byte sum masked to one byte
+    :param data: bytes-like
+    :return: int
+    """
+    return ~sum(data) & 0xff
+
+
+def encode_response(seq, message):
+    """
+    Description: Frame a response with its sequence character and checksum
+    :param seq: bytes (sequence character of the request)
+    :param message: bytes (space separated command responses)
+    :return: bytes (b'x RESP RESP ...#CK\\r', checksum as two upper case hex digits)
+    """
+    body = seq + b' ' + message
+    return b'%s#%02X\r' % (body, checksum(body))
+
+
+def decode_request(data):
+    """
+    Description: Extract the sequence character and command tokens from a request datagram
+    :param data: bytes-like (b'$x CMD ARG CMD ...#')
+    :return: (bytes, list of str) sequence character and command tokens, None if the datagram is malformed
+    """
+    m = REQUEST_PATTERN.match(data)
+    if m is None:
+        return None
+    try:
+        return m.group(1), m.group(2).decode('utf-8').split()
+    except UnicodeDecodeError:
+        return None
+
+
+def request_tokens(data):
+    """
+    Description: Command tokens of a request datagram without decoding or validating it, for matching requests
+    against sets of mnemonics
+    :param data: bytes-like (b'$x CMD ARG CMD ...#')
+    :return: list of bytes
+    """
+    return bytes(data).partition(b'#')[0][2:].split()
+
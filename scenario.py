@@ -0,0 +1,266 @@
+import argparse
+import json
+import random
+
+from protocol import request_tokens
+
+
+def load_config(path):
+    """
+    Description: Load a scenario or impairment configuration from a JSON file, or a YAML file (.yaml/.yml,
+    requires PyYAML)
+    :param path: str
+    :return: dict
+    """
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def parse_seconds(value):
+    """
+    Description: Parse a scenario time
+    :param value: number of seconds, or str with a unit suffix ('500ms', '30s', '2m', '1h')
+    :return: float seconds
+    :raises ValueError: if the value cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    for suffix, scale in (('ms', 1e-3), ('s', 1), ('m', 60), ('h', 3600)):
+        if text.endswith(suffix):
+            return float(text[:-len(suffix)]) * scale
+    return float(text)
+
+
+def parse_rate(value):
+    """
+    Description: Parse a scenario probability
+    :param value: float in [0, 1], or str '2%' or '1/1000'
+    :return: float
+    :raises ValueError: if the value cannot be parsed or is not a probability
+    """
+    text = str(value).strip()
+    if text.endswith('%'):
+        rate = float(text[:-1]) / 100
+    elif '/' in text:
+        num, den = text.split('/', 1)
+        rate = float(num) / float(den)
+    else:
+        rate = float(text)
+    if not 0 <= rate <= 1:
+        raise ValueError(f'{value} is not a probability')
+    return rate
+
+
+class Step:
+    """
+    One timed change of the simulator state:
+
+        {"at": "30s", "set": "fault_2", "bit": 6}       set bit 6 of fault_2
+        {"at": "45s", "clear": "fault_2", "bit": 6}     clear it
+        {"at": "60s", "set": "accel_voltage", "value": 0}
+        {"at": "90s", "null": "MAC", "count": 5}        answer the next 5 MAC with a null response (-1: forever)
+    """
+    __slots__ = ('at', 'action', 'target', 'arg')
+
+    def __init__(self, spec):
+        self.at = parse_seconds(spec['at'])
+        if 'null' in spec:
+            self.action, self.target, self.arg = 'null', spec['null'], int(spec.get('count', 1))
+        elif 'set' in spec and 'bit' in spec:
+            self.action, self.target, self.arg = 'set_bit', spec['set'], 1 << int(spec['bit'])
+        elif 'clear' in spec:
+            self.action, self.target, self.arg = 'clear_bit', spec['clear'], 1 << int(spec['bit'])
+        elif 'set' in spec:
+            self.action, self.target, self.arg = 'set', spec['set'], spec['value']
+        else:
+            raise ValueError(f'Scenario step {spec} has no set, clear or null action')
+
+    def apply(self, sim):
+        if self.action == 'null':
+            sim.nulls[self.target] = self.arg
+        elif self.action == 'set':
+            setattr(sim, self.target, self.arg)
+        elif self.action == 'set_bit':
+            setattr(sim, self.target, getattr(sim, self.target) | self.arg)
+        else:
+            setattr(sim, self.target, getattr(sim, self.target) & ~self.arg)
+
+    def __str__(self):
+        return f'{self.at:g}s {self.action} {self.target} {self.arg}'
+
+
+class Rule:
+    """
+    One probabilistic impairment of the replies, optionally limited to requests carrying one of the given
+    commands and to a window of scenario time:
+
+        {"drop": "2%", "commands": ["MAC"]}                 drop 2% of the replies to requests with MAC
+        {"delay": "500ms", "jitter": "100ms", "commands": ["MP"]}   delay them by 400 to 600 ms
+        {"corrupt": "1/1000"}                               corrupt the checksum of 1 in 1000 replies
+        {"drop": 1, "from": "2m", "until": "3m"}            no replies at all for a minute
+
+    A delay rule applies to every matching reply unless it also has a "rate".
+    """
+    __slots__ = ('kind', 'rate', 'delay', 'jitter', 'commands', 'start', 'stop', 'hits')
+
+    def __init__(self, spec):
+        self.delay = self.jitter = 0.0
+        if 'drop' in spec:
+            self.kind, self.rate = 'drop', parse_rate(spec['drop'])
+        elif 'corrupt' in spec:
+            self.kind, self.rate = 'corrupt', parse_rate(spec['corrupt'])
+        elif 'delay' in spec:
+            self.kind, self.rate = 'delay', parse_rate(spec.get('rate', 1))
+            self.delay = parse_seconds(spec['delay'])
+            self.jitter = parse_seconds(spec.get('jitter', 0))
+        else:
+            raise ValueError(f'Scenario rule {spec} has no drop, delay or corrupt action')
+        commands = spec.get('commands', spec.get('command'))
+        if isinstance(commands, str):
+            commands = [commands]
+        self.commands = frozenset(c.encode('utf-8') for c in commands) if commands else None
+        self.start = parse_seconds(spec.get('from', 0))
+        self.stop = parse_seconds(spec['until']) if 'until' in spec else float('inf')
+        self.hits = 0
+
+    def __str__(self):
+        what = f'{self.kind} {self.rate:g}'
+        if self.kind == 'delay':
+            what += f' {self.delay:g}s +-{self.jitter:g}s'
+        if self.commands:
+            what += f' on {b",".join(sorted(self.commands)).decode("utf-8")}'
+        if self.start or self.stop != float('inf'):
+            what += f' from {self.start:g}s until {self.stop:g}s'
+        return f'{what}: {self.hits} replies'
+
+
+class Scenario:
+    """
+    Fault-injection scenario run against a GenSimulator on its simulation clock (see clock.py), so
+    a scenario runs faster with the clock scaled up. A scenario is a timeline of state changes
+    (steps, see Step) and a set of probabilistic impairments of the replies (rules, see Rule):
+
+        {"seed": 1,
+         "steps": [{"at": "30s", "set": "fault_2", "bit": 6}],
+         "rules": [{"drop": "2%", "commands": ["MAC"]},
+                   {"delay": "500ms", "jitter": "100ms", "commands": ["MP"]},
+                   {"corrupt": "1/1000"}]}
+
+    Times are seconds since the scenario was started. The steps run on the physics thread at the
+    start of the tick they fall due in. The rules are evaluated by the command server for every reply
+    (filter); requests are only split into tokens again when an active rule is limited to some commands.
+    Scenario changes are not recorded by a capture, so a capture taken while a scenario runs does
+    not replay.
+    """
+    def __init__(self, spec):
+        """
+        :param spec: dict (see above)
+        :raises ValueError: if the scenario is not valid
+        """
+        try:
+            self.steps = sorted((Step(s) for s in spec.get('steps', [])), key=lambda step: step.at)
+            self.rules = [Rule(r) for r in spec.get('rules', [])]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid scenario: {e!r}') from e
+        self.seed = spec.get('seed')
+        self.rng = random.Random(self.seed)
+        self.t0 = None
+        self.next_step = 0
+        self.clock = None
+        self.replies = 0
+
+    @classmethod
+    def load(cls, path):
+        """
+        Description: Load a scenario from a JSON file, or a YAML file (.yaml/.yml, requires PyYAML)
+        :param path: str
+        :return: Scenario
+        """
+        return cls(load_config(path))
+
+    def start(self, sim):
+        """
+        Description: Start the scenario clock at the simulator's current simulation time
+        :param sim: GenSimulator
+        :return: n/a
+        """
+        self.clock = sim.clock
+        self.t0 = sim.clock.now
+        self.next_step = 0
+
+    @property
+    def elapsed(self):
+        return self.clock.now - self.t0
+
+    def run_due(self, sim):
+        """
+        Description: Apply the steps that have fallen due. Called by the physics thread every tick.
+        :param sim: GenSimulator
+        :return: n/a
+        """
+        steps = self.steps
+        elapsed = self.clock.now - self.t0
+        while self.next_step < len(steps) and steps[self.next_step].at <= elapsed:
+            step = steps[self.next_step]
+            self.next_step += 1
+            try:
+                step.apply(sim)
+            except (AttributeError, TypeError) as e:
+                print(f'Scenario: step {step} failed: {e}')
+
+    def filter(self, data, resp, delay):
+        """
+        Description: Apply the rules to one reply
+        :param data: bytes-like (request datagram)
+        :param resp: bytes (response datagram)
+        :param delay: float (seconds the reply is held before it is sent)
+        :return: (bytes, float) reply and delay, reply None if it is dropped
+        """
+        self.replies += 1
+        elapsed = self.clock.now - self.t0
+        rng = self.rng.random
+        tokens = None
+        for rule in self.rules:
+            if not rule.start <= elapsed < rule.stop:
+                continue
+            if rule.commands is not None:
+                if tokens is None:
+                    tokens = request_tokens(data)
+                if rule.commands.isdisjoint(tokens):
+                    continue
+            if rule.rate < 1 and rng() >= rule.rate:
+                continue
+            rule.hits += 1
+            if rule.kind == 'drop':
+                return None, delay
+            if rule.kind == 'delay':
+                delay = max(0.0, delay + rule.delay + (2 * rng() - 1) * rule.jitter)
+            else:
+                # Flip the checksum digits (b'...#CK\r')
+                resp = resp[:-3] + b'%02X\r' % (int(resp[-3:-1], 16) ^ 0xff)
+        return resp, delay
+
+    def status(self):
+        """
+        :return: str (progress of the scenario, for the 'scenario' control command)
+        """
+        lines = [f'scenario t = {self.elapsed:.1f} s, {self.next_step}/{len(self.steps)} steps applied, '
+                 f'{self.replies} replies filtered']
+        lines += [f'  step {step}' for step in self.steps[self.next_step:self.next_step + 5]]
+        lines += [f'  rule {rule}' for rule in self.rules]
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a fault-injection scenario file')
+    parser.add_argument('scenario', help='JSON or YAML scenario file')
+    args = parser.parse_args()
+    scenario = Scenario.load(args.scenario)
+    for step in scenario.steps:
+        print(f'step {step}')
+    for rule in scenario.rules:
+        print(f'rule {rule}')
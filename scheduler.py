@@ -0,0 +1,59 @@
+import time
+
+
+class TickScheduler:
+    """
+    Fixed-timestep scheduler used to drive the simulation physics at a constant rate.
+
+    Deadlines are computed from a fixed anchor (start + n * period) rather than from the end of the
+    previous tick, so the sleep/wakeup error of one tick does not accumulate into the next. When a
+    tick overruns by more than a whole period, the deadlines that have already passed are skipped
+    (not run back-to-back) and counted in missed_ticks.
+    """
+    MIN_RATE = 10       # Hz
+    MAX_RATE = 10000    # Hz
+
+    def __init__(self, rate=100):
+        self.period = 0
+        self.rate = rate
+        self.tick_count = 0
+        self.missed_ticks = 0
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, hz):
+        if not self.MIN_RATE <= hz <= self.MAX_RATE:
+            raise ValueError(f'Tick rate must be between {self.MIN_RATE} and {self.MAX_RATE} Hz (got {hz})')
+        self._rate = hz
+        self.period = 1.0 / hz
+
+    def run(self, tick, shutdown):
+        """
+        Description: Call tick(dt) once per period until the shutdown event is set.
+        :param tick: callable accepting the timestep (seconds) of the tick being run
+        :param shutdown: threading.Event used to stop the scheduler
+        :return: n/a
+        """
+        period = self.period
+        deadline = time.monotonic() + period
+        while not shutdown.is_set():
+            delay = deadline - time.monotonic()
+            if delay > 0 and shutdown.wait(delay):
+                break
+            self.tick_count += 1     # Counts the tick being run, so state published by tick n reads tick_count n
+            tick(period)
+            if self.period != period:
+                # Rate was changed while running, re-anchor the deadlines
+                period = self.period
+                deadline = time.monotonic() + period
+                continue
+            deadline += period
+            late = time.monotonic() - deadline
+            if late > period:
+                missed = int(late // period)
+                self.missed_ticks += missed
+                deadline += missed * period
+        return
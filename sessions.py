@@ -0,0 +1,168 @@
+import time
+from collections import OrderedDict
+
+from protocol import request_tokens
+
+# Command mnemonics whose responses may be served to a retransmitted request without executing it again
+READ_ONLY_PREFIXES = (b'M', b'R')
+
+
+class Session:
+    """
+    State of one client, identified by its (ip, port): sequence tracking, the last request and the
+    reply to it, and the interlock/lock commands the client has sent.
+    """
+    __slots__ = ('addr', 'created', 'last_seen', 'last_time', 'last_seq', 'last_request', 'last_reply',
+                 'last_mutating', 'requests', 'retransmits', 'duplicates', 'seq_gaps',
+                 'interlock_char', 'last_keepalive', 'interlock_enabled', 'unlocked')
+
+    def __init__(self, addr, now):
+        self.addr = addr
+        self.created = self.last_seen = now
+        self.last_time = None           # Time of the last request
+        self.last_seq = None            # Sequence character of the last request (int)
+        self.last_request = None
+        self.last_reply = None
+        self.last_mutating = False
+        self.requests = self.retransmits = self.duplicates = self.seq_gaps = 0
+        self.interlock_char = None      # Host interlock character of the client's last IC
+        self.last_keepalive = None      # Time of the client's last IC
+        self.interlock_enabled = False  # The client sent IE
+        self.unlocked = None            # Lock state after the client's last U
+
+    def __str__(self):
+        ip, port = self.addr
+        keepalive = '' if self.last_keepalive is None else f' IC {time.monotonic() - self.last_keepalive:.1f} s ago'
+        return (f'{ip}:{port} {self.requests} requests, {self.retransmits} retransmits served from cache, '
+                f'{self.duplicates} repeated, {self.seq_gaps} sequence gaps, '
+                f'idle {time.monotonic() - self.last_seen:.1f} s{keepalive}'
+                f'{" IE" if self.interlock_enabled else ""}'
+                f'{"" if self.unlocked is None else " unlocked" if self.unlocked else " locked"}')
+
+
+class SessionTable:
+    """
+    Per-client sessions of a simulator, keyed by the client's (ip, port) in an OrderedDict kept in
+    least recently used order, so lookup, insertion and eviction are O(1). Sessions idle for longer
+    than idle_timeout are evicted, as is the least recently used one when the table is full.
+
+    A request that repeats the client's previous request (same sequence character and bytes)
+    within retransmit_window seconds is a retransmit. If that request changed the simulator (any
+    command but the M* monitor and R* read commands, e.g. N or Q) the cached reply is sent again
+    instead of executing it twice; read-only requests are executed again so polls stay fresh.
+
+    The lock (U) and serial interlock (IE, IC) stay properties of the simulated generator; the
+    session records which client last sent them, for the 'sessions' control command.
+    """
+    def __init__(self, sim, idle_timeout=60.0, retransmit_window=2.0, max_sessions=1024):
+        """
+        :param sim: GenSimulator
+        :param idle_timeout: float seconds without a request after which a session is evicted
+        :param retransmit_window: float seconds during which a repeated request is treated as a retransmit
+        :param max_sessions: int
+        """
+        self.sim = sim
+        self.idle_timeout = idle_timeout
+        self.retransmit_window = retransmit_window
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.mutating = frozenset(cmd.encode('utf-8') for cmd in sim.COMMANDS
+                                  if not cmd.encode('utf-8').startswith(READ_ONLY_PREFIXES))
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def lookup(self, addr, now):
+        """
+        Description: Session of a client, created if needed and marked most recently used
+        :param addr: (ip, port)
+        :param now: float (time.monotonic())
+        :return: Session
+        """
+        sessions = self.sessions
+        session = sessions.get(addr)
+        if session is None:
+            self.expire(now)
+            if len(sessions) >= self.max_sessions:
+                sessions.popitem(last=False)
+                self.evicted += 1
+            session = sessions[addr] = Session(addr, now)
+        else:
+            sessions.move_to_end(addr)
+        session.last_seen = now
+        return session
+
+    def expire(self, now):
+        """
+        Description: Evict the sessions idle for longer than idle_timeout
+        :param now: float (time.monotonic())
+        :return: n/a
+        """
+        sessions = self.sessions
+        limit = now - self.idle_timeout
+        while sessions:
+            session = next(iter(sessions.values()))
+            if session.last_seen >= limit:
+                break
+            sessions.popitem(last=False)
+            self.evicted += 1
+
+    def begin(self, data, addr):
+        """
+        Description: Account a request to its session
+        :param data: bytes-like (request datagram)
+        :param addr: (ip, port) of the client
+        :return: (Session, bytes) the session and the cached reply to send if the request is a retransmit of
+        a request that changed the simulator, else None
+        """
+        now = time.monotonic()
+        session = self.lookup(addr, now)
+        session.requests += 1
+        last = session.last_seq
+        if last is None or len(data) < 2:
+            return session, None
+        seq = data[1]
+        if seq == last:
+            if session.last_request == data and now - session.last_time <= self.retransmit_window:
+                session.duplicates += 1
+                if session.last_mutating and session.last_reply is not None:
+                    session.retransmits += 1
+                    return session, session.last_reply
+        elif seq != (last - 0x61 + 1) % 26 + 0x61:     # Sequence characters run a to z
+            session.seq_gaps += 1
+        return session, None
+
+    def finish(self, session, data, resp):
+        """
+        Description: Record the reply to a request and the state the request changed
+        :param session: Session
+        :param data: bytes-like (request datagram)
+        :param resp: bytes (reply), None if the request was malformed
+        :return: n/a
+        """
+        tokens = request_tokens(data)
+        mutating = not self.mutating.isdisjoint(tokens)
+        session.last_seq = data[1] if len(data) > 1 else None
+        session.last_request = bytes(data)
+        session.last_reply = resp
+        session.last_mutating = mutating
+        session.last_time = session.last_seen
+        if mutating:
+            sim = self.sim
+            if b'IC' in tokens:
+                session.interlock_char = sim.host_interlock_char
+                session.last_keepalive = session.last_seen
+            if b'IE' in tokens:
+                session.interlock_enabled = True
+            if b'U' in tokens:
+                session.unlocked = not sim.system_locked
+
+    def status(self):
+        """
+        :return: str (one line per session, for the 'sessions' control command)
+        """
+        self.expire(time.monotonic())
+        lines = [f'{len(self.sessions)} sessions, {self.evicted} evicted']
+        lines += [f'  {session}' for session in reversed(self.sessions.values())]
+        return '\n'.join(lines)
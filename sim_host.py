@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import json
+import threading
+
+from fleet import GenFleet
+from persistence import TubeStore, DEFAULT_STORE_PATH
+
+
+class SimHost:
+    """
+    Hosts many simulated generators in one process. All units share one GenFleet (one physics thread)
+    and one asyncio event loop, with a datagram endpoint per unit.
+
+    Configuration (JSON):
+        {
+          "tick_rate": 100,
+          "seed": null,
+          "store": "tube_info.json",
+          "telemetry": "gensim_fleet",
+          "units": [
+            {"ip": "192.168.1.121", "port": 55556, "tube_str": "235DT", "gen_type": "MINI"},
+            {"ip": "0.0.0.0", "port": 56000, "count": 8, "tube_str": "RACK{n:02d}"},
+            {"ip": ["10.0.0.11", "10.0.0.12"], "port": 55556, "tube_str": "ALIAS{n}", "gen_type": "P385"}
+          ]
+        }
+
+    An entry with "count" expands to a port range (port, port + 1, ...), an entry with a list of "ip"
+    aliases expands to one unit per address on the same port. "{n}" in tube_str is replaced with the
+    unit's index within its entry. "out_port" (default 55555) sets the port responses are sent to.
+    "store" is the file holding the run seconds / amp hours of every tube (default tube_info.json).
+    "telemetry" (optional) names a shared memory block the live telemetry of every unit is exported to,
+    one record per unit in configuration order (see telemetry.py).
+    """
+    def __init__(self, config, seed=None, store=None, buffer=None):
+        """
+        :param config: dict (host configuration)
+        :param seed: seed for the fleet noise, overrides the configuration's seed when not None
+        :param store: persistence.TubeStore, overrides the configuration's store when not None
+        :param buffer: buffer to hold the fleet state arrays (see GenFleet), None to allocate them privately
+        """
+        if seed is None:
+            seed = config.get('seed')
+        self.units = self.expand_units(config.get('units', []))
+        if not self.units:
+            raise ValueError('Host configuration does not define any units')
+        kwargs = [{'gen_type': u['gen_type'], 'tube_str': u['tube_str'], 'gen_ip_num': u['ip']} for u in self.units]
+        self.store = TubeStore(config.get('store', DEFAULT_STORE_PATH)) if store is None else store
+        self.fleet = GenFleet(kwargs, tick_rate=config.get('tick_rate', 100), seed=seed, store=self.store,
+                              buffer=buffer)
+        for sim, unit in zip(self.fleet, self.units):
+            sim.gen_inp_port = unit['port']
+            sim.gen_out_port = unit['out_port']
+        self.telemetry = config.get('telemetry')
+
+    @classmethod
+    def from_file(cls, path, seed=None):
+        with open(path, 'r') as f:
+            return cls(json.load(f), seed=seed)
+
+    @staticmethod
+    def expand_units(entries):
+        """
+        Description: Expand port range / IP alias entries of a host configuration into one dict per unit
+        :param entries: list of dicts (see class docstring)
+        :return: list of dicts with keys ip, port, out_port, tube_str, gen_type
+        """
+        units = []
+        for entry in entries:
+            ips = entry.get('ip', '0.0.0.0')
+            if isinstance(ips, list):
+                addrs = [(ip, entry['port']) for ip in ips]
+            else:
+                addrs = [(ips, entry['port'] + n) for n in range(entry.get('count', 1))]
+            for n, (ip, port) in enumerate(addrs):
+                units.append({'ip': ip,
+                              'port': port,
+                              'out_port': entry.get('out_port', 55555),
+                              'tube_str': entry.get('tube_str', '235DT').format(n=n),
+                              'gen_type': entry.get('gen_type', 'MINI')})
+        return units
+
+    def run(self):
+        """
+        Description: Run the fleet physics thread and serve every unit from one event loop (blocking)
+        :return: n/a
+        """
+        exporter = self.fleet.export_telemetry(self.telemetry) if self.telemetry else None
+        shutdown_event = threading.Event()
+        t = threading.Thread(target=self.fleet.run_physics, args=(shutdown_event,), name='FleetPhysics')
+        print(f'Starting fleet physics thread for {len(self.fleet)} units at {self.fleet.tick_rate} Hz')
+        t.start()
+        try:
+            asyncio.run(self.serve())
+        finally:
+            shutdown_event.set()
+            t.join()
+            self.store.close()
+            if exporter is not None:
+                exporter.close()
+
+    async def serve(self):
+        """
+        Description: Bind an endpoint for every unit on the running event loop and serve until cancelled
+        :return: n/a
+        """
+        transports = []
+        try:
+            for sim in self.fleet:
+                transports.append(await sim.create_endpoint())
+                print(f'Unit {sim.tube_str} ({sim.gen_type}) listening on {sim.gen_ip_num}:{sim.gen_inp_port}')
+            await asyncio.get_running_loop().create_future()    # Run until cancelled
+        finally:
+            for transport in transports:
+                transport.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host many simulated generators from one process')
+    parser.add_argument('config', help='JSON host configuration file')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the fleet noise (overrides the configuration)')
+    args = parser.parse_args()
+    host = SimHost.from_file(args.config, seed=args.seed)
+    host.run()
@@ -8,10 +8,16 @@ my_ip = '192.168.1.60'
 sup_port = 6001
 in_port = 6002
 
+# Attributes streamed by the simulator's subscribe command
+snapshot_attrs = ['accel_current', 'accel_voltage', 'getter_current', 'system_state', 'faults', 'neutrons_on',
+                  'fault_1', 'fault_2', 'fault_3', 'fault_4', 'fault_5', 'fault_6']
+snapshot_rate = 2           # Snapshots per second
+subscribe_renew = 5000      # ms between subscription renewals (the simulator drops it after 10 s)
+
 
 out_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 in_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-in_socket.settimeout(1)     # How long to wait for a message before exception
+in_socket.setblocking(False)    # Polled from the Tk mainloop, never wait on it
 in_socket.bind((my_ip, in_port))
 print(f'Bound to input socket: {in_socket}')
 
@@ -174,79 +180,74 @@ fr3.grid(row=2, column=0, sticky='W')
 fr4.grid(row=3, column=0, sticky='W')
 fr5.grid(row=4, column=0, sticky='W')
 
-def update_labels():
-    try:
-        cmd = 'print accel_current'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        rval = float(data.split()[2].decode("utf-8"))
-        lbl_accel_current['text'] = f'Accel Current: {rval:06.2f}'
+def subscribe():
+    cmd = f'subscribe {snapshot_rate} {" ".join(snapshot_attrs)}'
+    out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
+    window.after(subscribe_renew, subscribe)
 
-        cmd = 'print accel_voltage'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        rval = float(data.split()[2].decode("utf-8"))
-        lbl_accel_voltage['text'] = f'Accel Voltage: {rval:06.2f}'
 
-        cmd = 'print getter_current'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        rval = float(data.split()[2].decode("utf-8"))
-        lbl_getter_current['text'] = f'Getter Current: {rval:04.2f}'
+def update_labels(snap):
+    rval = float(snap['accel_current'])
+    lbl_accel_current['text'] = f'Accel Current: {rval:06.2f}'
 
-        cmd = 'print system_state'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        rval = int(data.split()[2].decode("utf-8"))
-        lbl_system_state['text'] = f'System State: {rval}'
+    rval = float(snap['accel_voltage'])
+    lbl_accel_voltage['text'] = f'Accel Voltage: {rval:06.2f}'
 
-        cmd = 'print faults'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        if eval(data.split()[2].decode("utf-8")):
-            lbl_intlk_state['bg'] = '#ff1111'
-            lbl_intlk_state['text'] = f'Interlocks: TRIP'
-        else:
-            lbl_intlk_state['bg'] = '#11ee11'
-            lbl_intlk_state['text'] = f'Interlocks: OK'
+    rval = float(snap['getter_current'])
+    lbl_getter_current['text'] = f'Getter Current: {rval:04.2f}'
 
-        cmd = 'print neutrons_on'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-        data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-        if eval(data.split()[2].decode("utf-8")):
-            lbl_neut_state['bg'] = '#8b008b'
-            lbl_neut_state['text'] = f'Neutrons: ON'
-        else:
-            lbl_neut_state['bg'] = '#eeeeee'
-            lbl_neut_state['text'] = f'Neutrons: OFF'
-    except socket.timeout:
-        print('Socket timeout on UDP request')
+    rval = int(snap['system_state'])
+    lbl_system_state['text'] = f'System State: {rval}'
+
+    if snap['faults'] == 'True':
+        lbl_intlk_state['bg'] = '#ff1111'
+        lbl_intlk_state['text'] = f'Interlocks: TRIP'
+    else:
+        lbl_intlk_state['bg'] = '#11ee11'
+        lbl_intlk_state['text'] = f'Interlocks: OK'
+
+    if snap['neutrons_on'] == 'True':
+        lbl_neut_state['bg'] = '#8b008b'
+        lbl_neut_state['text'] = f'Neutrons: ON'
+    else:
+        lbl_neut_state['bg'] = '#eeeeee'
+        lbl_neut_state['text'] = f'Neutrons: OFF'
 
     for i in range(1, 7):
-        cmd = f'print fault_{i}'
-        out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
+        rval = int(snap[f'fault_{i}'])
+        if rval > 0:
+            lbl_fault_list[i-1]['bg'] = '#ff0000'
+        else:
+            lbl_fault_list[i - 1]['bg'] = '#eeffee'
+        lbl_fault_list[i-1]['text'] = f'Fault {i}: {rval:016b}'
+
+
+def poll_socket():
+    # Drain everything the simulator has sent without blocking the Tk mainloop
+    while True:
         try:
-            data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-            rval = int(data.split()[2].decode("utf-8"))
-            if rval > 0:
-                lbl_fault_list[i-1]['bg'] = '#ff0000'
-            else:
-                lbl_fault_list[i - 1]['bg'] = '#eeffee'
-            lbl_fault_list[i-1]['text'] = f'Fault {i}: {rval:016b}'
-        except:
-            print('Socket timeout on UDP request')
-    window.after(1000, update_labels)
+            data, addr = in_socket.recvfrom(1024)
+        except BlockingIOError:
+            break
+        msg = data.decode('utf-8')
+        if msg.startswith('snap '):
+            try:
+                update_labels(dict(item.split('=', 1) for item in msg.split()[1:]))
+            except (KeyError, ValueError):
+                print(f'Malformed snapshot: {msg}')
+        else:
+            # Reply to the print request sent by callback: '<attribute> = <value>'
+            fields = msg.split()
+            if len(fields) > 2 and fields[0] == attr_var.get() and fields[1] == '=':
+                ent_attr_tgt.delete(0, "end")
+                ent_attr_tgt.insert(0, fields[2])
+    window.after(50, poll_socket)
 
 
 def callback(*args):
     cmd = f'print {attr_var.get()}'
     #print(f'In callback sending : {cmd}')
-    out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))
-    data, addr = in_socket.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-    rval = data.split()[2].decode("utf-8")
-    #print(f'In callback with return of {rval}')
-    ent_attr_tgt.delete(0, "end")
-    ent_attr_tgt.insert(0, rval)
+    out_socket.sendto(cmd.encode('utf-8'), (sup_ip, sup_port))   # Reply is handled by poll_socket
 
 
 def set_attribute(*args):
@@ -259,11 +260,13 @@ def set_attribute(*args):
 callback()  # Grab the current attribute value
 ent_attr_tgt.bind('<Return>', set_attribute)
 attr_var.trace("w", callback)
-update_labels()
+subscribe()
+poll_socket()
 window.mainloop()
 exit()
 
 # Remove exit() above to interact directly with engine after killing GUI
+in_socket.settimeout(1)     # How long to wait for a message before exception
 while True:
     cmd = input('Enter command: ')
     cmdbytes = cmd.encode('utf-8')
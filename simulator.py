@@ -1,17 +1,159 @@
+import asyncio
+from collections import deque, namedtuple
+from operator import attrgetter
+import threading
+from time import perf_counter_ns
+
+from clock import SimClock
+from noise import NoiseSource
+from persistence import default_store
+from protocol import decode_request, encode_response
+from scheduler import TickScheduler
+
+
+class GenProtocol(asyncio.DatagramProtocol):
+    """
+    asyncio datagram protocol serving a GenSimulator. Replies are throttled by the simulator's
+    response_delay (and impaired by its impairment stage, see impairment.py) using scheduled sends,
+    so a delayed reply never blocks reception.
+    """
+    def __init__(self, sim):
+        self.sim = sim
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.sim.respond(data, addr, self.send)
+
+    def send(self, data, dest, delay):
+        if delay > 0:
+            metrics = self.sim.metrics
+            if metrics is not None:
+                metrics.reply_queue += 1
+            asyncio.get_running_loop().call_later(delay, self.send_delayed, data, dest, metrics)
+        else:
+            self.transport.sendto(data, dest)
+
+    def send_delayed(self, data, dest, metrics):
+        if metrics is not None:
+            metrics.reply_queue -= 1
+        self.transport.sendto(data, dest)
+
+    def error_received(self, exc):
+        print(f'Generator simulation: socket error {exc}')
+
+
+GenLimits = namedtuple('GenLimits', 'max_accel_current min_accel_current max_pulse_freq min_pulse_freq')
+
+
 class GenSimulator:
     """
     Generator simulator class
     """
-    # default port assignments
-    gen_inp_port = 55556
-    gen_out_port = 55555
-
-    debug = False
+    # Instance state is kept in slots: no per-instance __dict__
+    __slots__ = ('gen_type', 'tube_str', 'gen_ip_num', 'gen_inp_port', 'gen_out_port', 'debug', 'limits',
+                 # Device parameters
+                 'accel_current', 'accel_voltage', 'amp_hours', 'board_temp', 'system_state',
+                 'fault_1', 'fault_2', 'fault_3', 'fault_4', 'fault_5', 'fault_6',
+                 'getter_current', 'getter_voltage', 'high_voltage', 'input_emf',
+                 'pulse_duty_cycle', 'pulse_freq', 'pulse_width',
+                 'pulse1_delay', 'pulse1_width', 'pulse2_delay', 'pulse2_width', 'pulse3_delay', 'pulse3_width',
+                 'run_seconds', 'source_voltage', 'shutdown_time', 'system_locked', 'tube_pres', 'tube_temp',
+                 'host_interlock_char', 'serial_interlock_enabled',
+                 # Quiescent / transient values (tunable per unit)
+                 'IDEAL_TUBE_PRES', 'IDEAL_TUBE_TEMP', 'IDEAL_INPUT_EMF', 'IDEAL_BOARD_TEMP',
+                 'GETTER_IDLE', 'GETTER_RAMP', 'GETTER_RUNNING', 'ACCEL_VOLTAGE_WARM', 'NEUTRONS_RAMP_TIME',
+                 'ACCEL_CURRENT_NOISE', 'ACCEL_VOLTAGE_NOISE', 'GETTER_CURRENT_NOISE', 'ENV_NOISE',
+                 # Simulator specific attributes
+                 'sim_timer', 'response_delay', 'faults',
+                 'neutrons_on', 'neutrons_starting', 'neutrons_ramping_up', 'neutrons_ramping_down',
+                 'neutrons_start_time', 'accel_voltage_sp', 'accel_voltage_set', 'accel_current_sp',
+                 'accel_current_set', 'getter_current_sp', 'accel_voltage_ramping', 'accel_current_ramping',
+                 'getter_current_ramping', 'start_time', 'run_start_time', 'orig_seconds', 'socket_timeout',
+                 'clock', 'scheduler', 'noise', 'store', 'pending', 'physics_running', 'published', '_pinned', 'nulls',
+                 'recorder', 'exporter', 'metrics', 'scenario', 'impairment', 'response_cache',
+                 'cache_snap', 'sessions', 'reply_to_source')
 
-    def __init__(self, gen_type='MINI', tube_str='235DT', gen_ip_num='192.168.1.121'):
+    # default port assignments
+    DEFAULT_INP_PORT = 55556
+    DEFAULT_OUT_PORT = 55555
+
+    # Device constants per generator type (types not listed use DEFAULT_LIMITS)
+    GEN_LIMITS = {'MINI': GenLimits(max_accel_current=70, min_accel_current=20,
+                                    max_pulse_freq=20000, min_pulse_freq=250)}
+    DEFAULT_LIMITS = GenLimits(max_accel_current=100, min_accel_current=0, max_pulse_freq=10000, min_pulse_freq=1000)
+
+    # System states
+    SYSTEM_STATE_INIT = 0x0001
+    SYSTEM_STATE_RSV1 = 0x0002
+    SYSTEM_STATE_RSV2 = 0x0004
+    SYSTEM_STATE_STANDBY = 0x0008
+    SYSTEM_STATE_RUNNING = 0x0010
+    SYSTEM_STATE_FAULTED = 0x0020
+    SYSTEM_STATE_SSHV = 0x0040
+    SYSTEM_STATE_MCHG = 0x0080
+    SYSTEM_STATE_IDLE = 0x0100
+    SYSTEM_STATE_LAMP = 0x0200
+    SYSTEM_STATE_BMST = 0x0400
+    SYSTEM_STATE_SSBM = 0x0800
+    SYSTEM_STATE_SSBH = 0x1000
+    SYSTEM_STATE_SDBM = 0x2000
+    SYSTEM_STATE_SDHV = 0x4000
+    SYSTEM_STATE_TEST = 0x8000
+
+    # Physics rate at which the *_NOISE constants give one full step per tick. Service methods
+    # scale their steps by dt relative to this so ramp rates do not depend on the tick rate.
+    NOMINAL_TICK_RATE = 100
+
+    # Attributes making up a full state snapshot (control plane 'dump')
+    STATE_ATTRS = ('gen_type', 'tube_str', 'system_state', 'faults',
+                   'fault_1', 'fault_2', 'fault_3', 'fault_4', 'fault_5', 'fault_6',
+                   'accel_current', 'accel_voltage', 'getter_current', 'getter_voltage', 'high_voltage',
+                   'source_voltage', 'input_emf', 'board_temp', 'tube_pres', 'tube_temp',
+                   'run_seconds', 'amp_hours', 'shutdown_time',
+                   'pulse_duty_cycle', 'pulse_freq', 'pulse_width',
+                   'pulse1_delay', 'pulse1_width', 'pulse2_delay', 'pulse2_width', 'pulse3_delay', 'pulse3_width',
+                   'system_locked', 'host_interlock_char', 'serial_interlock_enabled',
+                   'neutrons_on', 'neutrons_starting', 'neutrons_ramping_up', 'neutrons_ramping_down',
+                   'accel_voltage_sp', 'accel_voltage_set', 'accel_current_sp', 'accel_current_set',
+                   'getter_current_sp', 'accel_voltage_ramping',
+                   'response_delay', 'tick_rate', 'tick_count', 'missed_ticks')
+
+    # Attributes restored from a capture header to rebuild the simulator for replay
+    CAPTURE_ATTRS = tuple(a for a in STATE_ATTRS if a not in ('tick_rate', 'tick_count', 'missed_ticks')) + \
+        ('neutrons_start_time', 'start_time', 'run_start_time', 'orig_seconds')
+
+    # Read-only monitor commands that only report from the published snapshot, their responses are cached per
+    # snapshot (see cached_response)
+    CACHED_COMMANDS = frozenset(('MAC', 'MAH', 'MAV', 'MBC', 'MEI', 'MFA', 'MFG', 'MH', 'MP', 'MRC', 'MTC', 'MTP',
+                                 'MTT', 'MF1', 'MF2', 'MF3', 'MF4', 'MF5', 'MF6'))
+
+    # Attributes written by the physics, and the setpoints it reads mid-tick. Control plane writes to these are
+    # deferred to the physics thread.
+    PHYSICS_ATTRS = frozenset(('accel_current', 'accel_voltage', 'getter_current', 'board_temp', 'tube_pres',
+                               'tube_temp', 'input_emf', 'system_state', 'faults', 'run_seconds', 'amp_hours',
+                               'fault_1', 'fault_2', 'fault_3', 'fault_4', 'fault_5', 'fault_6',
+                               'neutrons_on', 'neutrons_starting', 'neutrons_ramping_up', 'neutrons_ramping_down',
+                               'neutrons_start_time', 'start_time', 'orig_seconds', 'accel_voltage_sp',
+                               'accel_current_sp', 'getter_current_sp', 'accel_voltage_ramping',
+                               'accel_voltage_set', 'accel_current_set', 'shutdown_time'))
+
+    def __init__(self, gen_type='MINI', tube_str='235DT', gen_ip_num='192.168.1.121', tick_rate=100,
+                 seed=None, store=None, clock=None):
+        """
+        :param tick_rate: physics update rate (Hz)
+        :param seed: seed for the analog noise (None for OS entropy)
+        :param store: persistence.TubeStore for the tube run seconds / amp hours (default: the shared store)
+        :param clock: clock.SimClock advanced by the physics (default: a real-time clock starting now)
+        """
         self.gen_type = gen_type
         self.tube_str = tube_str
         self.gen_ip_num = gen_ip_num
+        self.gen_inp_port = self.DEFAULT_INP_PORT
+        self.gen_out_port = self.DEFAULT_OUT_PORT
+        self.debug = False
 
         # Below attributes correspond to device parameters
         self.accel_current = 0.0
@@ -48,33 +190,7 @@ class GenSimulator:
         self.serial_interlock_enabled = False
 
         # Device constants
-        if gen_type == 'MINI':
-            self.MAX_ACCEL_CURRENT = 70
-            self.MIN_ACCEL_CURRENT = 20
-            self.MAX_PULSE_FREQ = 20000
-            self.MIN_PULSE_FREQ = 250
-        else:
-            self.MAX_ACCEL_CURRENT = 100
-            self.MIN_ACCEL_CURRENT = 0
-            self.MAX_PULSE_FREQ = 10000
-            self.MIN_PULSE_FREQ = 1000
-        # System states
-        self.SYSTEM_STATE_INIT = 0x0001
-        self.SYSTEM_STATE_RSV1 = 0x0002
-        self.SYSTEM_STATE_RSV2 = 0x0004
-        self.SYSTEM_STATE_STANDBY = 0x0008
-        self.SYSTEM_STATE_RUNNING = 0x0010
-        self.SYSTEM_STATE_FAULTED = 0x0020
-        self.SYSTEM_STATE_SSHV = 0x0040
-        self.SYSTEM_STATE_MCHG = 0x0080
-        self.SYSTEM_STATE_IDLE = 0x0100
-        self.SYSTEM_STATE_LAMP = 0x0200
-        self.SYSTEM_STATE_BMST = 0x0400
-        self.SYSTEM_STATE_SSBM = 0x0800
-        self.SYSTEM_STATE_SSBH = 0x1000
-        self.SYSTEM_STATE_SDBM = 0x2000
-        self.SYSTEM_STATE_SDHV = 0x4000
-        self.SYSTEM_STATE_TEST = 0x8000
+        self.limits = self.GEN_LIMITS.get(gen_type, self.DEFAULT_LIMITS)
         # quiescent / transient values
         self.IDEAL_TUBE_PRES = 120.003
         self.IDEAL_TUBE_TEMP = 36.0
@@ -95,7 +211,6 @@ class GenSimulator:
         self.sim_timer = 0
         self.response_delay = 100000    # Delay time in microseconds
         self.faults = True
-        self.msg_list = []
         self.neutrons_on = False
         self.neutrons_starting = False
         self.neutrons_ramping_up = False
@@ -110,239 +225,548 @@ class GenSimulator:
         self.accel_current_ramping = False
         self.getter_current_ramping = False
         self.start_time = 0
+        self.run_start_time = 0         # Simulated time the neutrons came on (auto shut down)
         self.orig_seconds = self.run_seconds
         self.socket_timeout = 2.0
+        self.scheduler = TickScheduler(tick_rate)
+        self.clock = SimClock() if clock is None else clock
+        self.noise = NoiseSource(seed)
+        self.pending = deque()          # Updates posted to the physics thread: (func, args)
+        self.physics_running = False
+        self._pinned = None             # Snapshot serving the request being executed
+        self.recorder = None            # capture.CaptureWriter while a session is being captured
+        self.exporter = None            # telemetry.TelemetryExporter while telemetry is exported
+        self.metrics = None             # metrics.Metrics while instrumentation is enabled
+        self.scenario = None            # scenario.Scenario being run
+        self.impairment = None          # impairment.Impairment applied to the replies
+        self.response_cache = {}        # Cached command mnemonic -> response formatted from cache_snap
+        self.cache_snap = None
+        self.sessions = None            # sessions.SessionTable while client sessions are tracked
+        self.reply_to_source = False    # Reply to the client's source port instead of gen_out_port
 
         # NULL cmd flags
         self.nulls = {}
 
-        def mf_method_factory(name, i):
-            """
-            Factory method to create class (M)onitor (F)ault methods when instantiated.
-            :param name: Name to give the instantiated method
-            :param i: Fault word number
-            :return: Entrypoint to instantiated method
-            """
-            def MFn_template():
-                """
-                Command: Monitor Fault word n
-                Function: Returns the fault status word.
-                Details: This command returns the specific bitmapped decimal fault word (16 bits),
-                corresponding to fault word n. See generator documentation for details on fault words
-                :return: (int) a
-                """
-                MFn_template.__name__ = name
-                try:
-                    return str(getattr(self, f'fault_{i}'))
-                except Exception as e:
-                    print(f'Exception in generated function : {name}')
-                    raise e
-            return MFn_template
-
-        def rp_method_factory(name, i, p):
-            """
-            Factory method to create (R)ead (P)ulse methods when instantiated.
-            :param name: Name to give the instantiated method
-            :param i: Pulse number (int)
-            :param p: Parameter type (D)elay or (W)idth
-            :return: Entrypoint to instantiated method
-            """
-
-            def RPnp_template():
-                """
-                Command: Read Pulse n Delay / Width
-                Function: Sets the pulse n delay or width in microseconds.
-                Details: This command allows the user to set the pulse n delay or width.
-                No bounds checking is done.
-                Inputs: xxx
-                :return:
-                   xxx.xxx (?????)
-                """
-                RPnp_template.__name__ = name
-                if p == 'D':
-                    try:
-                        return str(getattr(self, f'pulse{i}_delay'))
-                    except Exception as e:
-                        print(f'Exception in generated function : {name}')
-                        raise e
-                else:
-                    try:
-                        return str(getattr(self, f'pulse{i}_width'))
-                    except Exception as e:
-                        print(f'Exception in generated function : {name}')
-                        raise e
-
-            return RPnp_template
-
-        def sp_method_factory(name, i, p):
-            """
-            Factory method to create (S)et (P)ulse methods when instantiated.
-            :param name: Name to give the instantiated method
-            :param i: Pulse number (int)
-            :param p: Parameter type (D)elay or (W)idth
-            :return: Entrypoint to instantiated method
-            """
-
-            def SPnp_template():
-                """
-                Command: Set Pulse n Delay / Width
-                Function: Sets the pulse n delay or width in microseconds.
-                Details: This command allows the user to set the pulse n delay or width.
-                No bounds checking is done.
-                Inputs: xxx
-                :return:
-                   xxx.xxx (?????)
-                """
-                SPnp_template.__name__ = name
-                try:
-                    if p == 'D':
-                        val = float(self.msg_list.pop(0))
-                        setattr(self, f'pulse{i}_delay', val)
-                    else:
-                        val = float(self.msg_list.pop(0))
-                        setattr(self, f'pulse{i}_width', val)
-                    return str(val)
-                except Exception as e:
-                    print(f'Exception in generated function : {name}')
-                    raise e
-            return SPnp_template
-
-        # Create methods based on factory templates
-        # Pulse methods (RP, SP)
-        for i in range(1, 4):
-            for t in ['SP', 'RP']:
-                for p in 'DW':
-                    name = f'{t}{i}{p}'
-                    setattr(self, name, eval(f'{t.lower()}_method_factory(name, i, p)'))
-
-        # Fault methods (MF)
-        for i in range(1, 7):
-            name = f'MF{i}'
-            setattr(self, name, mf_method_factory(name, i))
-
-        try:
-            f = open(f'{self.tube_str}_info.txt', 'r')
-            nfo = f.readline().split()
-            self.run_seconds = self.orig_seconds = int(nfo[0])
-            self.amp_hours = int(nfo[1])
+        self.store = default_store() if store is None else store
+        nfo = self.store.load(self.tube_str)
+        if nfo is None:
+            self.save_tube_info()
+        else:
+            self.run_seconds = self.orig_seconds = nfo[0]
+            self.amp_hours = nfo[1]
             print(f'Generator info found for tube {self.tube_str}: {self.run_seconds} , '
                   f'{self.amp_hours}')
-            f.close()
-        except FileNotFoundError:
-            f = open(f'{self.tube_str}_info.txt', 'w')
-            f.write(f'{self.run_seconds} {self.amp_hours}')
-            f.close()
+        self.publish()                  # self.published: latest StateSnapshot, replaced (never modified)
 
     def analog_noise(self, noise):
         """
         :param noise: float (magnitude of random change)
         :return: float (input value with noise applied)
         """
-        import random
-        random.seed()
+        return self.noise.sample() * noise
+
+    @property
+    def MAX_ACCEL_CURRENT(self):
+        return self.limits.max_accel_current
+
+    @property
+    def MIN_ACCEL_CURRENT(self):
+        return self.limits.min_accel_current
 
-        return random.random() * noise
+    @property
+    def MAX_PULSE_FREQ(self):
+        return self.limits.max_pulse_freq
 
-    def exec_func(self):
+    @property
+    def MIN_PULSE_FREQ(self):
+        return self.limits.min_pulse_freq
+
+    @property
+    def tick_rate(self):
+        return self.scheduler.rate
+
+    @tick_rate.setter
+    def tick_rate(self, hz):
+        self.scheduler.rate = hz
+
+    @property
+    def tick_count(self):
+        return self.scheduler.tick_count
+
+    @property
+    def missed_ticks(self):
+        return self.scheduler.missed_ticks
+
+    def step_scale(self, dt):
+        """
+        Description: Convert a timestep into the number of nominal ticks it represents, so rates of change do
+        not depend on the tick rate (see step_toward for the setpoint clamp)
+        :param dt: float (timestep in seconds), None for one nominal tick
+        :return: float
+        """
+        if dt is None:
+            return 1.0
+        return dt * self.NOMINAL_TICK_RATE
+
+    @staticmethod
+    def step_toward(value, setpoint, step, wiggle):
+        """
+        Description: Move a value towards its setpoint. The step is clamped to end at most wiggle past the setpoint,
+        so long timesteps do not overshoot it by more than one nominal tick would.
+        :param value: float
+        :param setpoint: float
+        :param step: float (change over the timestep, >= 0)
+        :param wiggle: float (largest excursion past the setpoint)
+        :return: float (new value)
         """
-        Description: Utilizing msg_list stack, pop off first element and return reference to corresponding method
-        :return: function (reference)
+        if value > setpoint:
+            return value - min(step, value - setpoint + wiggle)
+        return value + min(step, setpoint - value + wiggle)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.build_command_table()
+
+    @classmethod
+    def build_command_table(cls):
         """
-        cmd = self.msg_list.pop(0)
+        Description: Build the command dispatch table of the class. Every method with an upper case name is a
+        command mnemonic, mapped to (method, number of arguments it consumes from the request).
+        :return: n/a
+        """
+        import inspect
+
+        cls.COMMANDS = {name: (func, func.__code__.co_argcount - 1)
+                        for name, func in inspect.getmembers(cls, inspect.isfunction) if name.isupper()}
+
+    def exec_func(self, tokens, i):
+        """
+        Description: Execute the command at tokens[i] through the COMMANDS dispatch table, passing it the
+        arguments that follow it in the request.
+        :param tokens: list of str (command tokens of a request)
+        :param i: int (index of the command mnemonic in tokens)
+        :return: (str, int) command response, index of the next command mnemonic in tokens
+        """
+        cmd = tokens[i]
+        func, nargs = self.COMMANDS.get(cmd, (None, 0))
+        nxt = i + 1 + nargs
         # Check to see if this command is being voided via the simulator controller
-        if self.nulls.get(cmd, 0) != 0:
+        metrics = self.metrics
+        if self.nulls and self.nulls.get(cmd, 0) != 0:
             if self.nulls[cmd] > 0:
                 self.nulls[cmd] -= 1
-            self.msg_list.insert(0, cmd)    # Put name of command onto msg_list for use in send_null method
-            func = getattr(self, 'send_null')
-            return func()
-        try:
-            func = getattr(self, cmd)
-        except AttributeError:
+            if metrics is not None:
+                metrics.nulled_commands += 1
+            return self.send_null(cmd), nxt
+        if func is None:
             print(f'Generator simulation: unknown message received: {cmd}')
-            func = getattr(self, 'null_cmd')
-        return func()
+            if metrics is not None:
+                metrics.unknown_commands += 1
+            return self.null_cmd(), nxt
+        if nxt > len(tokens):
+            print(f'Generator simulation: missing arguments for {cmd}: {tokens[i + 1:]}')
+            return self.null_cmd(), nxt
+        if metrics is not None:
+            t0 = perf_counter_ns()
+        if cmd in self.CACHED_COMMANDS:
+            resp = self.cached_response(cmd, func)
+        else:
+            try:
+                resp = func(self, *tokens[i + 1:nxt])
+            except ValueError as e:
+                print(f'Generator simulation: invalid arguments for {cmd}: {tokens[i + 1:nxt]} ({e})')
+                resp = '1'
+        if metrics is not None:
+            metrics.command(cmd, perf_counter_ns() - t0)
+        return resp, nxt
+
+    def cached_response(self, cmd, func):
+        """
+        Description: Response of a read-only monitor command, formatted once per published snapshot (a new tick
+        publishes a new snapshot)
+        :param cmd: str (mnemonic in CACHED_COMMANDS)
+        :param func: the command method
+        :return: str
+        """
+        snap = self._pinned or self.published
+        cache = self.response_cache
+        if snap is not self.cache_snap:
+            cache.clear()
+            self.cache_snap = snap
+        resp = cache.get(cmd)
+        if resp is None:
+            resp = cache[cmd] = func(self)
+        return resp
+
+    def invalidate_cache(self):
+        """
+        Description: Drop the cached monitor responses, for writes that bypass the command dispatch
+        :return: n/a
+        """
+        self.cache_snap = None
+
+    def enable_metrics(self):
+        """
+        Description: Start recording command latencies, packet counts and tick durations (see metrics.py)
+        :return: Metrics
+        """
+        from metrics import Metrics
+
+        if self.metrics is None:
+            self.metrics = Metrics(self.scheduler.period)
+        return self.metrics
+
+    def disable_metrics(self):
+        self.metrics = None
 
-    def run_simulation(self):
+    def run_scenario(self, scenario):
+        """
+        Description: Start running a fault-injection scenario (see scenario.py), replacing the current one
+        :param scenario: Scenario, None to stop the current scenario
+        :return: n/a
+        """
+        if scenario is not None:
+            scenario.start(self)
+        self.scenario = scenario
+
+    def run_simulation(self, bulk_io=False, capture=None):
         """
         description: Main simulation engine. Accepts and responds to UDP commands and affects simulation parameters.
+        :param bulk_io: bool (serve with batched datagram I/O instead of the asyncio server)
+        :param capture: str (path of a capture log to record the session to, see capture.py), None to not capture
+        :return: n/a
+        """
+        if capture is not None:
+            self.start_capture(capture)
+        shutdown_event = threading.Event()
+        t = threading.Thread(target=self.run_physics, args=(shutdown_event,), name='GeneratorPhysics')
+        print(f'Starting simulator thread at {self.tick_rate} Hz')
+        t.start()
+        try:
+            if bulk_io:
+                self.serve_bulk()
+            else:
+                asyncio.run(self.serve())
+        finally:
+            shutdown_event.set()
+            if self.recorder is not None:
+                t.join()
+                self.recorder.close()
+                self.recorder = None
+
+    def start_capture(self, path):
+        """
+        Description: Start recording requests, responses, control commands and posted updates to a capture log.
+        The noise is reseeded (with a fresh seed if none was given) so the session can be replayed exactly.
+        Must be called while the physics is not running.
+        :param path: str (capture log)
+        :return: n/a
+        """
+        import random
+        from capture import CaptureWriter
+
+        seed = self.noise.seed if self.noise.seed is not None else random.getrandbits(32)
+        self.noise = NoiseSource(seed)
+        state = {attr: getattr(self, attr) for attr in self.CAPTURE_ATTRS}
+        self.recorder = CaptureWriter(path, {'seed': seed, 'tick_rate': self.tick_rate, 'gen_type': self.gen_type,
+                                             'tube_str': self.tube_str, 'tick_count': self.tick_count,
+                                             'clock': self.clock.now, 'clock_scale': self.clock.scale,
+                                             'state': state})
+        print(f'Capturing session to {path} (seed {seed})')
+
+    def serve_bulk(self):
+        """
+        Description: Serve UDP commands with batched I/O. Every pass drains all readable requests, executes them
+        and flushes the replies together; response_delay is applied by holding replies in the batcher.
         :return: n/a
         """
-        import re
         import socket
-        import time
-        import threading
+        from bulkio import DatagramBatcher
 
-        resp_list = []
-        sock_timeout = self.socket_timeout
-
-        in_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # in_sock.settimeout(sock_timeout)     # How long to wait for a message before exception
-        out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        in_sock.bind((self.gen_ip_num, self.gen_inp_port))
-
-        def strip_msg(bdata):
-            sdata = bdata.decode('UTF-8')
-            pat = re.compile('\$[a-z](.+?)#')  # Match all characters between $? and #
-            m = pat.match(sdata)
-            return m.group(0)[1], m.group(1).split()
-
-        def send_msg(message, addr, seq):
-            chk = generate_checksum(seq + ' ' + message)
-            respstr = f'{seq} {message}#{chk[2:].zfill(2)}\r'
-            # respstr = f'{seq}{message}#{chk}\r\x00'
-            respbytes = respstr.encode('utf-8')  # Convert string to byte object
-            if self.debug:
-                print(f'Sending {respbytes} to {addr}')
-            out_sock.sendto(respbytes, (addr, self.gen_out_port))
-
-        def generate_checksum(message):
-            s = 0
-            for i in range(len(message)):
-                s += ord(message[i])
-            return hex(~s & 0xff).upper()   # Mask to one byte, invert and return
-                                            # Using uppercase to deal with strange client requirement
-
-        def threaded_simulator(shutdown):
-            while not shutdown.is_set():
-                self.svc_gen_state()
-                self.svc_accel_voltage()
-                self.svc_accel_current()
-                self.svc_getter_current()
-                self.svc_environment()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((self.gen_ip_num, self.gen_inp_port))
+        io = DatagramBatcher(sock)
+        try:
+            while True:
+                io.wait()
+                batch = io.drain()
+                for data, addr in batch:
+                    try:
+                        self.respond(data, addr, io.queue)
+                    except Exception as e:
+                        # One bad datagram must not take the server (and with it the physics) down
+                        print(f'Generator simulation: failed to serve {bytes(data)} from {addr}: {e!r}')
+                        if self.metrics is not None:
+                            self.metrics.malformed += 1
+                io.flush()
+                metrics = self.metrics
+                if metrics is not None:
+                    metrics.reply_queue = len(io.delayed) + len(io.outbox)
+                    metrics.drain(len(batch), len(batch) == len(io.views))
+        finally:
+            sock.close()
+
+    async def serve(self):
+        """
+        Description: Serve UDP commands on the running event loop until cancelled.
+        :return: n/a
+        """
+        transport = await self.create_endpoint()
+        try:
+            await asyncio.get_running_loop().create_future()    # Run until cancelled
+        finally:
+            transport.close()
+
+    async def create_endpoint(self):
+        """
+        Description: Bind a GenProtocol for this simulator to (gen_ip_num, gen_inp_port) on the running event loop.
+        :return: asyncio.DatagramTransport
+        """
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: GenProtocol(self),
+                                                           local_addr=(self.gen_ip_num, self.gen_inp_port))
+        return transport
+
+    def respond(self, data, addr, send):
+        """
+        Description: Serve one request datagram: execute it (or answer a retransmit from the client's session) and
+        pass the reply through the scenario and impairment stages to the server
+        :param data: bytes-like (request datagram)
+        :param addr: (ip, port) of the client
+        :param send: callable(data, dest, delay) sending a reply after delay seconds
+        :return: n/a
+        """
+        sessions = self.sessions
+        if sessions is None:
+            respbytes = self.handle_msg(data)
+        else:
+            session, respbytes = sessions.begin(data, addr)
+            if respbytes is None:
+                respbytes = self.handle_msg(data)
+                sessions.finish(session, data, respbytes)
+        if respbytes is None:
             return
+        # Throttle our responses a bit
+        delay = self.response_delay / 1e6
+        scenario = self.scenario
+        if scenario is not None:
+            respbytes, delay = scenario.filter(data, respbytes, delay)
+            if respbytes is None:
+                return
+        dest = addr if self.reply_to_source else (addr[0], self.gen_out_port)
+        if self.debug:
+            print(f'Sending {respbytes} to {dest}')
+        impairment = self.impairment
+        if impairment is None:
+            send(respbytes, dest, delay)
+        else:
+            for copy, copy_delay in impairment.apply(data, respbytes, addr[0], delay):
+                send(copy, dest, copy_delay)
+
+    def enable_sessions(self, idle_timeout=60.0, retransmit_window=2.0):
+        """
+        Description: Track client sessions (see sessions.py), so retransmitted requests are answered from cache
+        instead of executing commands like N or Q twice
+        :param idle_timeout: float seconds without a request after which a session is evicted
+        :param retransmit_window: float seconds during which a repeated request is treated as a retransmit
+        :return: SessionTable
+        """
+        from sessions import SessionTable
+
+        if self.sessions is None:
+            self.sessions = SessionTable(self, idle_timeout=idle_timeout, retransmit_window=retransmit_window)
+        return self.sessions
+
+    def handle_msg(self, data):
+        """
+        Description: Execute every command in a request datagram and build the response datagram.
+        :param data: bytes (request datagram, '$x CMD ARG CMD ...#')
+        :return: bytes (response datagram) or None if the request could not be parsed
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.packets_in += 1
+            metrics.bytes_in += len(data)
+        request = decode_request(data)
+        if request is None:
+            print(f'Generator simulation: malformed message received: {data}')
+            if metrics is not None:
+                metrics.malformed += 1
+            return None
+        seq, tokens = request
+        if self.debug:
+            print(f'Received : {seq} : {tokens} extracted from {data}')
+        # Every monitor command of the request reports from the same snapshot
+        self._pinned = self.published
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.inbound(self._pinned.tick_count, data)
+        resp_list = []
+        # Fast path: cached monitor responses are taken from the cache without going through exec_func, unless
+        # commands may be nulled or have to be timed
+        fast = metrics is None and not self.nulls
+        cached = self.response_cache.get
+        append = resp_list.append
+        i = 0
+        try:
+            if fast and self.cache_snap is not self._pinned:
+                self.response_cache.clear()
+                self.cache_snap = self._pinned
+            while i < len(tokens):
+                if fast:
+                    resp = cached(tokens[i])
+                    if resp is not None:
+                        append(resp)
+                        i += 1
+                        continue
+                resp, i = self.exec_func(tokens, i)
+                append(resp)
+        finally:
+            self._pinned = None
+        resp = encode_response(seq, ' '.join(resp_list).encode('utf-8'))
+        if recorder is not None:
+            recorder.outbound(self.tick_count, resp)
+        if metrics is not None:
+            metrics.packets_out += 1
+            metrics.bytes_out += len(resp)
+        return resp
+
+    def run_physics(self, shutdown):
+        """
+        Description: Physics loop. Runs tick() at tick_rate until the shutdown event is set.
+        :param shutdown: threading.Event
+        :return: n/a
+        """
+        self.physics_running = True
+        try:
+            self.scheduler.run(self.tick, shutdown)
+        finally:
+            self.physics_running = False
 
-        shutdown_event = threading.Event()
-        t = threading.Thread(target=threaded_simulator, args=(shutdown_event,))
-        print(f'Starting simulator thread')
-        t.start()
+    def tick(self, dt):
+        """
+        Description: Advance the simulation by one timestep: apply posted updates, run the physics on the live
+        state and publish the result.
+        :param dt: float (timestep in seconds)
+        :return: n/a
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            t0 = perf_counter_ns()
+        applied = self.apply_pending()
+        if applied and self.recorder is not None:
+            self.recorder.applied(self.tick_count, applied)
+        if self.scenario is not None:
+            self.scenario.run_due(self)
+        self.advance(dt)
+        if metrics is not None:
+            metrics.tick_done(perf_counter_ns() - t0)
+
+    def advance(self, dt):
+        """
+        Description: Run the physics for one timestep and publish the result
+        :param dt: float (timestep in seconds)
+        :return: n/a
+        """
+        self.clock.tick(dt)
+        self.svc_gen_state()
+        self.svc_accel_voltage(dt)
+        self.svc_accel_current(dt)
+        self.svc_getter_current(dt)
+        self.svc_environment(dt)
+        self.publish()
+
+    def post(self, func, *args):
+        """
+        Description: Run func(*args) on the physics thread at the start of the next tick, so state changes made by
+        command and control handlers never interleave with a tick. Runs immediately (and republishes) if the
+        physics is not running. Never blocks.
+        :return: n/a
+        """
+        if self.physics_running:
+            self.pending.append((func, args))
+        else:
+            func(*args)
+            self.publish()
 
-        while True:
+    def apply_pending(self, limit=None):
+        """
+        Description: Apply the updates posted since the last tick
+        :param limit: int (apply at most this many), None for all
+        :return: int (number of updates applied)
+        """
+        pending = self.pending
+        count = len(pending) if limit is None else min(limit, len(pending))
+        for _ in range(count):
+            func, args = pending.popleft()
             try:
-                data, addr = in_sock.recvfrom(1024)  # Will wait for socket.timeout before throwing exception
-                seq, self.msg_list = strip_msg(data)
-                if self.debug:
-                    print(f'Received : {seq} : {self.msg_list} extracted from {data}')
-                resp_list.clear()
-                while len(self.msg_list) > 0:
-                    resp_list.append(self.exec_func())
-                resp = ' '.join(resp_list)
-                # Throttle our responses a bit
-                time.sleep(self.response_delay / 1e6)
-                send_msg(resp, addr[0], seq)
-            except socket.timeout:
-                print(f'[{time.strftime("%H:%M:%S",time.localtime())}] UDP receive timeout')
-
-        shutdown_event.set()
+                func(*args)
+            except Exception as e:
+                print(f'Generator simulation: posted update {func.__name__}{args} failed: {e}')
+        return count
 
+    def set_attr(self, name, value):
+        """
+        Description: Control plane write. Writes to attributes owned by the physics are posted to the physics thread.
+        :raises AttributeError: if the attribute does not exist
+        """
+        if name in self.PHYSICS_ATTRS:
+            getattr(self, name)
+            self.post(setattr, self, name, value)
+        else:
+            setattr(self, name, value)
+        self.invalidate_cache()
+
+    def publish(self):
+        """
+        Description: Publish an immutable snapshot of the current state. Readers pick up the new snapshot with a
+        single reference read, so they never see a tick half applied and never hold up the physics.
+        :return: n/a
+        """
+        snap = self.published = StateSnapshot._make(_state_getter(self))
+        if self.exporter is not None:
+            self.exporter.write(0, snap, self.clock.now)
+
+    def export_telemetry(self, name):
+        """
+        Description: Publish the live telemetry to a shared memory block every tick (see telemetry.py)
+        :param name: str (shared memory block name)
+        :return: TelemetryExporter
+        """
+        from telemetry import TelemetryExporter
+
+        exporter = TelemetryExporter(name, units=1)
+        exporter.write(0, self.published, self.clock.now)
+        self.exporter = exporter
+        print(f'Exporting telemetry to shared memory block {name}')
+        return exporter
+
+    @property
+    def view(self):
+        """
+        :return: StateSnapshot (the snapshot pinned for the request being executed, else the latest published)
+        """
+        return self._pinned or self.published
+
+    def snapshot(self, attrs=None):
+        """
+        Description: Consistent, immutable view of a set of attributes, taken from the latest published snapshot.
+        Attributes that are not part of the snapshot (tunables, settings) are read directly.
+        :param attrs: iterable of attribute names (default STATE_ATTRS)
+        :return: dict of attribute name -> value
+        :raises AttributeError: if an attribute does not exist
+        """
+        snap = self.view
+        if attrs is None:
+            return snap._asdict()
+        return {attr: getattr(snap if attr in _STATE_FIELDS else self, attr) for attr in attrs}
 
     def svc_gen_state(self):
         """
         Description: Main state-machine for simulation.
         :return:
         """
-        import time
-
+        now = self.clock.now
         self.check_system_state()
 
         if self.system_state & self.SYSTEM_STATE_FAULTED == self.SYSTEM_STATE_FAULTED:
@@ -352,18 +776,23 @@ class GenSimulator:
             self.system_state = self.SYSTEM_STATE_SSHV  # Soft beam start
             self.getter_current_sp = self.GETTER_RAMP
             self.accel_voltage_sp = self.ACCEL_VOLTAGE_WARM
-            self.neutrons_start_time = time.time()
+            self.neutrons_start_time = now
             self.neutrons_starting = False
             self.neutrons_ramping_up = True
             return
-        if self.neutrons_ramping_up and (time.time() - self.neutrons_start_time) > self.NEUTRONS_RAMP_TIME:
+        if self.neutrons_ramping_up and (now - self.neutrons_start_time) > self.NEUTRONS_RAMP_TIME:
             self.system_state = self.SYSTEM_STATE_RUNNING
             self.getter_current_sp = self.GETTER_RAMP
             self.neutrons_ramping_up = False
             self.neutrons_on = True
-            self.start_time = int(time.time())
+            self.start_time = int(now)
+            self.run_start_time = now
             return
         if self.neutrons_on:
+            if 0 < self.shutdown_time <= now - self.run_start_time:
+                # Auto shut down (SUT), the run ended shutdown_time after it started
+                self.account_run_time(int(self.run_start_time + self.shutdown_time))
+                self.neutrons_ramping_down = True
             self.accel_voltage_sp = self.accel_voltage_set
             self.accel_current_sp = self.accel_current_set
             self.getter_current_sp = self.GETTER_RUNNING
@@ -386,84 +815,94 @@ class GenSimulator:
             self.getter_current_sp = self.GETTER_IDLE
         if self.system_state != self.SYSTEM_STATE_RUNNING:
             if self.run_seconds != self.orig_seconds:
-                f = open(f'{self.tube_str}_info.txt', 'w')
-                f.write(f'{self.run_seconds} {self.amp_hours}')
-                f.close()
-                self.orig_seconds = self.run_seconds
+                self.save_tube_info()
         return
-    
-    def svc_accel_current(self):
+
+    def save_tube_info(self):
+        """
+        Description: Records the tube run seconds and amp hours in the tube store (written by its writer thread)
+        :return:
+        """
+        self.store.update(self.tube_str, self.run_seconds, self.amp_hours)
+        self.orig_seconds = self.run_seconds
+
+    def svc_accel_current(self, dt=None):
         """
         Description: Services the accelerator current parameter
+        :param dt: float (timestep in seconds), None for one nominal tick
         :return:
         """
-        if self.accel_current > self.accel_current_sp:
-            self.accel_current -= self.analog_noise(self.ACCEL_CURRENT_NOISE)
-        else:
-            self.accel_current += self.analog_noise(self.ACCEL_CURRENT_NOISE)
+        k = self.step_scale(dt)
+        noise = self.analog_noise(self.ACCEL_CURRENT_NOISE)
+        self.accel_current = self.step_toward(self.accel_current, self.accel_current_sp, noise * k, noise)
         if self.accel_current_sp == 0 and self.accel_current < 5:
             self.accel_current = 0
         return
 
-    def svc_accel_voltage(self):
+    def svc_accel_voltage(self, dt=None):
         """
         Description: Services the accelerator voltage parameter
+        :param dt: float (timestep in seconds), None for one nominal tick
         :return:
         """
+        k = self.step_scale(dt)
         if self.accel_voltage_ramping:
-            self.accel_voltage += self.analog_noise(5)
+            noise = self.analog_noise(5)
+            self.accel_voltage += min(noise * k, max(self.accel_voltage_sp - self.accel_voltage, 0) + noise)
             if abs(self.accel_voltage_sp - self.accel_voltage < 6):
                 self.accel_voltage_ramping = False
-        elif self.accel_voltage > self.accel_voltage_sp:
-            self.accel_voltage -= self.analog_noise(self.ACCEL_VOLTAGE_NOISE)
         else:
-            self.accel_voltage += self.analog_noise(self.ACCEL_VOLTAGE_NOISE)
+            noise = self.analog_noise(self.ACCEL_VOLTAGE_NOISE)
+            self.accel_voltage = self.step_toward(self.accel_voltage, self.accel_voltage_sp, noise * k, noise)
         if self.accel_voltage_sp == 0 and self.accel_voltage < 5:
             self.accel_voltage = 0
         return
 
-    def svc_getter_current(self):
+    def svc_getter_current(self, dt=None):
         """
         Description: Services the getter current parameter
+        :param dt: float (timestep in seconds), None for one nominal tick
         :return:
         """
         if self.getter_current_sp == 0:
             return
+        k = self.step_scale(dt)
         if self.system_state == self.SYSTEM_STATE_RUNNING:
-            if self.getter_current > self.getter_current_sp:
-                self.getter_current -= self.analog_noise(self.GETTER_CURRENT_NOISE)  # Wiggle the value a little
-            else:
-                self.getter_current += self.analog_noise(self.GETTER_CURRENT_NOISE)  # Wiggle the value a little
+            noise = self.analog_noise(self.GETTER_CURRENT_NOISE)   # Wiggle the value a little
+            self.getter_current = self.step_toward(self.getter_current, self.getter_current_sp, noise * k, noise)
         else:
-            if self.getter_current > self.getter_current_sp:
-                self.getter_current -= abs(self.getter_current_sp - self.getter_current) * .001
-                #self.getter_current -= self.analog_noise(self.GETTER_CURRENT_NOISE*.5)  # Wiggle the value a little
-            else:
-                self.getter_current += abs(self.getter_current_sp - self.getter_current) * .001
-                #self.getter_current += self.analog_noise(self.GETTER_CURRENT_NOISE*.5)  # Wiggle the value a little
+            settle = abs(self.getter_current_sp - self.getter_current) * .001 * k
+            self.getter_current = self.step_toward(self.getter_current, self.getter_current_sp, settle, 0)
         return
 
-    def svc_environment(self):
+    def svc_environment(self, dt=None):
         """
         Description: Services the generator environmental parameters
+        :param dt: float (timestep in seconds), None for one nominal tick
         :return:
         """
-        import time
-
+        k = self.step_scale(dt)
         # Vary the parameters a bit somewhat randomly
         for parm in ['IDEAL_BOARD_TEMP', 'IDEAL_TUBE_PRES', 'IDEAL_TUBE_TEMP', 'IDEAL_INPUT_EMF']:
             # Not crazy about hard-coding these constants like this^^
             sp = float(getattr(self, parm))
             curr_val = float(getattr(self, parm[6:].lower()))
-            if self.analog_noise(1) > 0.8:  # Don't update values at every iteration
+            if self.analog_noise(1) > 1 - 0.2 * k:  # Don't update values at every iteration
                 if curr_val > sp:
                     setattr(self, parm[6:].lower(), curr_val - self.analog_noise(self.ENV_NOISE))
                 else:
                     setattr(self, parm[6:].lower(), curr_val + self.analog_noise(self.ENV_NOISE))
-        if (self.system_state == self.SYSTEM_STATE_RUNNING) & (time.time() > self.start_time):
-            self.run_seconds += int(time.time()) - self.start_time
-            self.amp_hours += int((int(time.time()) - self.start_time) * self.accel_current)
-            self.start_time = int(time.time())
+        self.account_run_time(int(self.clock.now))
+
+    def account_run_time(self, now):
+        """
+        Description: Adds the time spent running since the last update to the run seconds and amp hours
+        :param now: int (simulated time, seconds)
+        """
+        if (self.system_state == self.SYSTEM_STATE_RUNNING) & (now > self.start_time):
+            self.run_seconds += now - self.start_time
+            self.amp_hours += int((now - self.start_time) * self.accel_current)
+            self.start_time = now
 
     def check_system_state(self):
         """
@@ -476,6 +915,41 @@ class GenSimulator:
             self.accel_voltage = self.accel_voltage_sp = 0
             self.getter_current_sp = self.getter_current = 0
 
+    def clear_faults(self):
+        """
+        Description: Clears all of the current fault conditions (see C)
+        """
+        self.faults = False
+        self.system_state = self.SYSTEM_STATE_IDLE
+        self.fault_1 = 0
+
+    def hard_shutdown(self):
+        """
+        Description: User generated fault, drops all voltages and currents (see Q)
+        """
+        self.faults = True         # This should be set by a separate fault monitoring task
+        self.system_state = self.SYSTEM_STATE_FAULTED     # This should be set by a separate fault monitoring task
+        self.accel_current = self.accel_current_sp = 0
+        self.accel_voltage = self.accel_voltage_sp = 0
+        self.getter_current_sp = self.getter_current = 0
+        self.fault_1 = self.fault_1 | 0x80
+
+    def start_neutrons(self, val):
+        """
+        Description: Sets the HVPS setting and starts up the system if needed (see N)
+        :param val: float (kV)
+        """
+        self.accel_voltage_set = val
+        self.accel_voltage_ramping = True
+        if not self.neutrons_on:
+            self.neutrons_starting = True
+
+    def ramp_down_neutrons(self):
+        """
+        Description: Starts an orderly ramp down of the neutron output (see IM, IN, IS)
+        """
+        self.neutrons_ramping_down = True
+
     def null_cmd(self):
         """
         Entrypoint for all unknown commands
@@ -484,13 +958,14 @@ class GenSimulator:
         """
         return '0'
 
-    def send_null(self):
+    def send_null(self, cmd):
         """
         Method to return NULL character
 
+        :param cmd: str (command being voided)
         :return: \00
         """
-        print(f'NULL being returned in response to cmd : {self.msg_list.pop(0)}')
+        print(f'NULL being returned in response to cmd : {cmd}')
         return '\00'    # Null
 
     def C(self):
@@ -500,12 +975,10 @@ class GenSimulator:
 
         :return: 0
         """
-        self.faults = False
-        self.system_state = self.SYSTEM_STATE_IDLE
-        self.fault_1 = 0
+        self.post(self.clear_faults)
         return '0'
 
-    def IC(self):       # Check via packet capture
+    def IC(self, val, char):       # Check via packet capture
         """
         Command: Interlock Character
         Function: Receives the interlock character that keeps the serial port
@@ -525,12 +998,10 @@ class GenSimulator:
 
         :return: '] (remote interlock character)'
         """
-        val = self.msg_list.pop(0)
         if val != '[':
             print(f'In IC function, expected \'[\' but found \'{val}\'')
-            self.msg_list.pop(0)    # Flush out character from cmd stack
         else:
-            self.host_interlock_char = self.msg_list.pop(0)
+            self.host_interlock_char = char
         return f'] {self.host_interlock_char}'
 
     def IE(self):
@@ -567,7 +1038,7 @@ class GenSimulator:
         # check for valid entry?
         # Set mode to "HV start / Soft start"
         # Ramp up the voltage
-        self.neutrons_ramping_down = True
+        self.post(self.ramp_down_neutrons)
         return '0'
 
     def IN(self):       # Check via packet capture
@@ -585,10 +1056,10 @@ class GenSimulator:
             '2' fault
         """
 
-        self.neutrons_ramping_down = True
+        self.post(self.ramp_down_neutrons)
         return '0'
 
-    def IR(self):  # Check via packet capture
+    def IR(self, val):  # Check via packet capture
         """
         Command: Interlock Reset
         Function: Disables and resets the serial port interlock circuit.
@@ -607,7 +1078,6 @@ class GenSimulator:
         :return:
             '0'
         """
-        val = self.msg_list.pop(0)
         # Do something with this val to verify proper password??
         return '0'
 
@@ -629,7 +1099,7 @@ class GenSimulator:
             '1' illegal transition from current state
             '2' fault
         """
-        self.neutrons_ramping_down = True
+        self.post(self.ramp_down_neutrons)
         return '0'
 
     def MAC(self):
@@ -640,7 +1110,7 @@ class GenSimulator:
 
         :return: self.accel_current
         """
-        return f'{self.accel_current:.2f}'
+        return f'{self.view.accel_current:.2f}'
 
     def MAH(self):
         """
@@ -650,7 +1120,7 @@ class GenSimulator:
         :return:
             self.amp_hours
         """
-        return f'{self.amp_hours:.3f}'
+        return f'{self.view.amp_hours:.3f}'
 
     def MAV(self):
         """
@@ -660,7 +1130,7 @@ class GenSimulator:
         :return:
             self.accel_voltage
         """
-        return f'{self.accel_voltage:.1f}'
+        return f'{self.view.accel_voltage:.1f}'
 
     def MBC(self):
         """
@@ -671,7 +1141,7 @@ class GenSimulator:
         :return:
             self.accel_current
         """
-        return f'{self.accel_current:.2f}'
+        return f'{self.view.accel_current:.2f}'
 
     def MEI(self):
         """
@@ -681,7 +1151,7 @@ class GenSimulator:
         :return:
             self.input_emf
         """
-        return f'{self.input_emf:.1f}'
+        return f'{self.view.input_emf:.1f}'
 
     def MFA(self):
         """
@@ -694,12 +1164,13 @@ class GenSimulator:
         :return:
             0xfault_1 0xfault_2 0xfault_3 0xfault_4 0xfault_5 0xfault_6
         """
-        f1str = f'0x{f"{self.fault_1:0x}".zfill(4)}'
-        f2str = f'0x{f"{self.fault_2:0x}".zfill(4)}'
-        f3str = f'0x{f"{self.fault_3:0x}".zfill(4)}'
-        f4str = f'0x{f"{self.fault_4:0x}".zfill(4)}'
-        f5str = f'0x{f"{self.fault_5:0x}".zfill(4)}'
-        f6str = f'0x{f"{self.fault_6:0x}".zfill(4)}'
+        snap = self.view
+        f1str = f'0x{f"{snap.fault_1:0x}".zfill(4)}'
+        f2str = f'0x{f"{snap.fault_2:0x}".zfill(4)}'
+        f3str = f'0x{f"{snap.fault_3:0x}".zfill(4)}'
+        f4str = f'0x{f"{snap.fault_4:0x}".zfill(4)}'
+        f5str = f'0x{f"{snap.fault_5:0x}".zfill(4)}'
+        f6str = f'0x{f"{snap.fault_6:0x}".zfill(4)}'
         return f'{f1str} {f2str} {f3str} {f4str} {f5str} {f6str}'
 
     def MFG(self):
@@ -710,7 +1181,7 @@ class GenSimulator:
         :return:
             '0' if no faults, '1' if any faults
         """
-        if self.faults:
+        if self.view.faults:
             return '1'
         else:
             return '0'
@@ -724,7 +1195,7 @@ class GenSimulator:
         :return:
             self.run_seconds
         """
-        return f'{self.run_seconds}'
+        return f'{self.view.run_seconds}'
 
     def MI(self):
         """
@@ -770,7 +1241,7 @@ class GenSimulator:
         :return:
             self.system_state
         """
-        return f'{self.system_state}'
+        return f'{self.view.system_state}'
 
     def MRC(self):
         """
@@ -780,7 +1251,7 @@ class GenSimulator:
         :return:
             self.getter_current
         """
-        return f'{self.getter_current:.1f}'
+        return f'{self.view.getter_current:.1f}'
 
     def MRR(self):
         """
@@ -791,7 +1262,7 @@ class GenSimulator:
             self.getter_voltage / self.getter_current
         """
         try:
-            val = self.getter_voltage / self.getter_current
+            val = self.getter_voltage / self.view.getter_current
         except ZeroDivisionError:
             val = 999999
         return f'{val:.1f}'
@@ -823,7 +1294,7 @@ class GenSimulator:
         :return:
             self.board_temp
         """
-        return f'{self.board_temp:.2f}'
+        return f'{self.view.board_temp:.2f}'
 
     def MTD(self):
         """
@@ -844,7 +1315,7 @@ class GenSimulator:
         :return:
             self.tube_pres
         """
-        return f'{self.tube_pres:.1f}'
+        return f'{self.view.tube_pres:.1f}'
 
     def MTS(self):
         """
@@ -854,7 +1325,7 @@ class GenSimulator:
             xxx.x
         """
         print('MTS not implemented yet')
-        return f'{self.board_temp:.1f}'
+        return f'{self.view.board_temp:.1f}'
 
     def MTT(self):
         """
@@ -866,9 +1337,9 @@ class GenSimulator:
         :return:
             self.tube_temp
         """
-        return f'{self.tube_temp:.2f}'
+        return f'{self.view.tube_temp:.2f}'
 
-    def N(self):
+    def N(self, val):
         """
         Command: Neutrons xx.xx
         Inputs: xx (setting of the HVPS)
@@ -898,11 +1369,7 @@ class GenSimulator:
         # check for valid entry?
         # Set mode to "HV start / Soft start"
         # Ramp up the voltage
-        val = float(self.msg_list.pop(0))
-        self.accel_voltage_set = val
-        self.accel_voltage_ramping = True
-        if not self.neutrons_on:
-            self.neutrons_starting = True
+        self.post(self.start_neutrons, float(val))
         return '0'
 
     def Q(self):
@@ -922,12 +1389,7 @@ class GenSimulator:
         :return:
             0
         """
-        self.faults = True         # This should be set by a separate fault monitoring task
-        self.system_state = self.SYSTEM_STATE_FAULTED     # This should be set by a separate fault monitoring task
-        self.accel_current = self.accel_current_sp = 0
-        self.accel_voltage = self.accel_voltage_sp = 0
-        self.getter_current_sp = self.getter_current = 0
-        self.fault_1 = self.fault_1 | 0x80
+        self.post(self.hard_shutdown)
         return '0'
 
     def RBV(self):
@@ -1034,14 +1496,21 @@ class GenSimulator:
         return 'NA'
 
     def RUT(self):
-        print('RUT not implemented yet')
-        return 'NA'
+        """
+        Command: Read User Time
+        Function: Returns the auto shut down time in seconds (see SUT), 0 if the system runs until the user
+        shuts it down.
+
+        :return:
+            self.shutdown_time
+        """
+        return f'{self.shutdown_time}'
 
     def RZTC(self):
         print('RZTC not implemented yet')
         return 'NA'
 
-    def SBV(self):
+    def SBV(self, val):
         """
         Command: Set Beam Value
 
@@ -1058,9 +1527,9 @@ class GenSimulator:
             '0' (cmd OK)
             '1' (cmd invalid / out of range)
         """
-        val = float(self.msg_list.pop(0))
+        val = float(val)
         if self.MIN_ACCEL_CURRENT < val < self.MAX_ACCEL_CURRENT:
-            self.accel_current_set = val
+            self.post(setattr, self, 'accel_current_set', val)
             return '0'
         else:
             return '1'
@@ -1073,7 +1542,7 @@ class GenSimulator:
         print('SEA not implemented yet')
         return 'na'
 
-    def SPD(self):
+    def SPD(self, val):
         """
         Command: Set Pulse Duty
 
@@ -1094,7 +1563,7 @@ class GenSimulator:
             '0' (cmd OK)
             '1' (cmd invalid / out of range)
         """
-        val = float(self.msg_list.pop(0))
+        val = float(val)
         if val == 100 or (20 <= val <= 50):
             self.pulse_duty_cycle = val
             return '0'
@@ -1102,7 +1571,7 @@ class GenSimulator:
             # Invalid entry
             return '1'
 
-    def SPF(self):
+    def SPF(self, val):
         """
         Command: Set Pulse Frequency
 
@@ -1121,7 +1590,7 @@ class GenSimulator:
             '0' (cmd OK)
             '1' (cmd invalid / out of range)
         """
-        val = float(self.msg_list.pop(0))
+        val = float(val)
         if val == 0:
             # Setting to DC mode is valid
             self.pulse_freq = 0
@@ -1141,7 +1610,7 @@ class GenSimulator:
         print('SUM not implemented yet')
         return 'na'
 
-    def SUT(self):
+    def SUT(self, val):
         """
         Command: Set User Time
 
@@ -1159,17 +1628,20 @@ class GenSimulator:
         Attribute: shutdown_time
 
         :return:
-            '0'
+            '0' (cmd OK)
+            '1' (cmd invalid / out of range)
         """
-
-        self.shutdown_time = self.msg_list.pop(0)
+        val = float(val)        # Clients send the time as 3600 or 3600.0
+        if not 0 <= val < float('inf'):
+            return '1'
+        self.post(setattr, self, 'shutdown_time', int(val))
         return '0'
 
     def SZTC(self):
         print('SZTC not implemented yet')
         return 'na'
 
-    def U(self):
+    def U(self, code):
         """
         Command: Unlock
 
@@ -1190,7 +1662,7 @@ class GenSimulator:
             '1' (system unlocked)
             '0' (system locked)
         """
-        if self.msg_list.pop(0) == 'TMFP':
+        if code == 'TMFP':
             self.system_locked = False
             return '1'
         else:
@@ -1198,3 +1670,97 @@ class GenSimulator:
             return '0'
 
 
+def mf_method_factory(name, i):
+    """
+    Factory method to create (M)onitor (F)ault methods.
+    :param name: Name to give the created method
+    :param i: Fault word number
+    :return: function
+    """
+    attr = f'fault_{i}'
+
+    def MFn_template(self):
+        """
+        Command: Monitor Fault word n
+        Function: Returns the fault status word.
+        Details: This command returns the specific bitmapped decimal fault word (16 bits),
+        corresponding to fault word n. See generator documentation for details on fault words
+        :return: (int) a
+        """
+        return str(getattr(self.view, attr))
+
+    MFn_template.__name__ = name
+    MFn_template.__qualname__ = f'GenSimulator.{name}'
+    return MFn_template
+
+
+def rp_method_factory(name, i, p):
+    """
+    Factory method to create (R)ead (P)ulse methods.
+    :param name: Name to give the created method
+    :param i: Pulse number (int)
+    :param p: Parameter type (D)elay or (W)idth
+    :return: function
+    """
+    attr = f'pulse{i}_delay' if p == 'D' else f'pulse{i}_width'
+
+    def RPnp_template(self):
+        """
+        Command: Read Pulse n Delay / Width
+        Function: Returns the pulse n delay or width in microseconds.
+        :return:
+           xxx.xxx (?????)
+        """
+        return str(getattr(self, attr))
+
+    RPnp_template.__name__ = name
+    RPnp_template.__qualname__ = f'GenSimulator.{name}'
+    return RPnp_template
+
+
+def sp_method_factory(name, i, p):
+    """
+    Factory method to create (S)et (P)ulse methods.
+    :param name: Name to give the created method
+    :param i: Pulse number (int)
+    :param p: Parameter type (D)elay or (W)idth
+    :return: function
+    """
+    attr = f'pulse{i}_delay' if p == 'D' else f'pulse{i}_width'
+
+    def SPnp_template(self, val):
+        """
+        Command: Set Pulse n Delay / Width
+        Function: Sets the pulse n delay or width in microseconds.
+        Details: This command allows the user to set the pulse n delay or width.
+        No bounds checking is done.
+        Inputs: xxx
+        :return:
+           xxx.xxx (?????)
+        """
+        val = float(val)
+        setattr(self, attr, val)
+        return str(val)
+
+    SPnp_template.__name__ = name
+    SPnp_template.__qualname__ = f'GenSimulator.{name}'
+    return SPnp_template
+
+
+# Snapshot of the attributes in GenSimulator.STATE_ATTRS, published by the physics every tick
+StateSnapshot = namedtuple('StateSnapshot', GenSimulator.STATE_ATTRS)
+_state_getter = attrgetter(*GenSimulator.STATE_ATTRS)
+_STATE_FIELDS = frozenset(GenSimulator.STATE_ATTRS)
+
+# Create methods based on factory templates
+# Pulse methods (RP, SP)
+for _i in range(1, 4):
+    for _p in 'DW':
+        setattr(GenSimulator, f'SP{_i}{_p}', sp_method_factory(f'SP{_i}{_p}', _i, _p))
+        setattr(GenSimulator, f'RP{_i}{_p}', rp_method_factory(f'RP{_i}{_p}', _i, _p))
+
+# Fault methods (MF)
+for _i in range(1, 7):
+    setattr(GenSimulator, f'MF{_i}', mf_method_factory(f'MF{_i}', _i))
+
+GenSimulator.build_command_table()
@@ -0,0 +1,287 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from bulkio import DatagramBatcher
+from fleet import fleet_layout
+from persistence import TubeStore, DEFAULT_STORE_PATH
+from sim_host import SimHost
+
+
+def run_worker(shard, config, seed, shm_name, records, conn, client_port):
+    """
+    Description: Worker process entry point. Hosts one shard of the units in a SimHost whose fleet state arrays
+    live in the shared memory block, and executes the control commands routed to it by the supervisor.
+    :param shard: int (worker index)
+    :param config: dict (SimHost configuration of the shard, one entry per unit)
+    :param seed: seed for the shard's fleet noise (None for OS entropy)
+    :param shm_name: str (shared memory block holding the shard's fleet arrays)
+    :param records: dict of tube_str -> (run_seconds, amp_hours), the supervisor persists the run hours
+    :param conn: multiprocessing connection receiving (row, command tokens, client addr) from the supervisor, 'ready'
+        is sent back once the shard's state arrays hold the stored run hours
+    :param client_port: int (port control responses are sent to)
+    :return: n/a
+    """
+    from control import ControlPlane
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    store = TubeStore(path=None)
+    store.records.update(records)
+    host = SimHost(config, seed=seed, store=store, buffer=shm.buf)
+    conn.send('ready')      # The supervisor may persist the shard's run hours from now on
+
+    out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    lock = threading.Lock()
+
+    def send_to_client(ip, msg):
+        with lock:
+            out_sock.sendto(msg.encode('utf-8'), (ip, client_port))
+
+    controls = [ControlPlane(sim, send_to_client) for sim in host.fleet]
+
+    def control_loop():
+        while True:
+            due = [d for d in (c.next_due() for c in controls) if d is not None]
+            if conn.poll(min(due) if due else None):
+                try:
+                    row, cmd, addr = conn.recv()
+                except EOFError:
+                    os._exit(0)     # Supervisor went away
+                try:
+                    controls[row].handle(cmd, addr)
+                except SystemExit:
+                    pass            # 'quit' is handled by the supervisor
+                except Exception as e:
+                    # A malformed command must not stop the shard from serving the next ones
+                    print(f'Worker {shard}: control command {cmd} failed: {e!r}')
+                    send_to_client(addr[0], ControlPlane.USAGE)
+            for control in controls:
+                control.publish()
+
+    threading.Thread(target=control_loop, name=f'ShardControl{shard}', daemon=True).start()
+    print(f'Worker {shard} (pid {os.getpid()}) hosting {len(host.fleet)} units')
+    try:
+        host.run()
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """
+    Shards the units of a host configuration (see SimHost) across a pool of worker processes, one
+    shard per core, so the physics of every shard runs on its own core instead of competing for the
+    GIL. Each worker steps its shard as one GenFleet whose state arrays live in a shared memory block
+    also mapped by the supervisor.
+
+    A single control endpoint accepts the gensim.py control commands prefixed with the unit they
+    apply to, and routes them to the worker hosting that unit:
+
+        @<unit> <command> ...   unit index or tube_str, e.g. '@3 set response_delay 0', '@RACK02 print run_seconds'
+        @* <command> ...        every unit
+        units                   list the units and the worker hosting each
+        quit                    stop every worker and the supervisor
+
+    Run hours are persisted by the supervisor from shared memory into the configuration's store.
+    Control responses are sent to the configuration's "client_port" (default 6002).
+    """
+    PERSIST_INTERVAL = 1.0      # seconds
+
+    def __init__(self, config, workers=None, seed=None):
+        """
+        :param config: dict (SimHost configuration)
+        :param workers: int (number of worker processes, default one per core, at most one per unit)
+        :param seed: seed for the noise, overrides the configuration's seed when not None (shard n uses seed + n)
+        """
+        if seed is None:
+            seed = config.get('seed')
+        self.config = config
+        self.seed = seed
+        self.units = SimHost.expand_units(config.get('units', []))
+        if not self.units:
+            raise ValueError('Host configuration does not define any units')
+        workers = workers or os.cpu_count() or 1
+        self.workers = max(1, min(workers, len(self.units)))
+        # Contiguous shards of (almost) equal size
+        bounds = [len(self.units) * n // self.workers for n in range(self.workers + 1)]
+        self.shards = [list(range(bounds[n], bounds[n + 1])) for n in range(self.workers)]
+        self.route = {}     # unit index or tube_str -> (shard, row)
+        for shard, rows in enumerate(self.shards):
+            for row, unit in enumerate(rows):
+                self.route[str(unit)] = self.route[self.units[unit]['tube_str']] = (shard, row)
+        self.store = TubeStore(config.get('store', DEFAULT_STORE_PATH))
+        self.blocks = []
+        self.arrays = []    # Per shard: dict of field name -> array mapped onto the shard's shared memory
+        self.conns = []
+        self.procs = []
+        self.ready = []     # Per shard: the worker has loaded the stored run hours into shared memory
+
+    def start(self):
+        """
+        Description: Create the shared memory blocks and start the workers
+        :return: n/a
+        """
+        ctx = multiprocessing.get_context('spawn')
+        for shard, rows in enumerate(self.shards):
+            layout, nbytes = fleet_layout(len(rows))
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.blocks.append(shm)
+            self.arrays.append({name: np.ndarray(len(rows), dtype=dtype, buffer=shm.buf, offset=offset)
+                                for name, dtype, offset in layout})
+            units = [self.units[unit] for unit in rows]
+            config = {'tick_rate': self.config.get('tick_rate', 100),
+                      'units': [{'ip': u['ip'], 'port': u['port'], 'out_port': u['out_port'],
+                                 'tube_str': u['tube_str'], 'gen_type': u['gen_type']} for u in units]}
+            records = {}
+            for u in units:
+                rec = self.store.load(u['tube_str'])
+                if rec is not None:
+                    records[u['tube_str']] = rec
+            conn, worker_conn = ctx.Pipe()
+            seed = None if self.seed is None else self.seed + shard
+            proc = ctx.Process(target=run_worker, name=f'GenShard{shard}',
+                               args=(shard, config, seed, shm.name, records, worker_conn,
+                                     self.config.get('client_port', 6002)))
+            proc.start()
+            self.conns.append(conn)
+            self.ready.append(False)
+            self.procs.append(proc)
+
+    def shard_ready(self, shard):
+        """
+        Description: Check whether a worker has signalled that its shard's state arrays are initialized. Until then
+        they are zero-filled and must not be persisted over the stored run hours.
+        :param shard: int
+        :return: bool
+        """
+        conn = self.conns[shard]
+        if not self.ready[shard] and conn.poll():
+            try:
+                self.ready[shard] = conn.recv() == 'ready'
+            except (EOFError, OSError):
+                pass        # The worker died before it initialized
+        return self.ready[shard]
+
+    def persist(self):
+        """
+        Description: Record the run hours of every unit that changed in the store, skipping the shards whose worker
+        has not initialized yet
+        :return: n/a
+        """
+        for shard, arrays in enumerate(self.arrays):
+            if shard >= len(self.conns) or not self.shard_ready(shard):
+                continue
+            rows = self.shards[shard]
+            run_seconds = arrays['run_seconds'].copy()
+            amp_hours = arrays['amp_hours'].copy()
+            for row, unit in enumerate(rows):
+                tube = self.units[unit]['tube_str']
+                rec = (int(run_seconds[row]), int(amp_hours[row]))
+                if rec != self.store.records.get(tube):
+                    self.store.update(tube, *rec)
+
+    def handle(self, cmd, addr, send):
+        """
+        Description: Route one control command
+        :param cmd: list of str (command tokens)
+        :param addr: (ip, port) of the client
+        :param send: callable(ip, msg) sending a response string to the client
+        :return: bool (False once 'quit' was received)
+        """
+        if not cmd:
+            return True
+        if cmd[0] == 'quit':
+            return False
+        if cmd[0] == 'units':
+            lines = [f'{n} {u["tube_str"]} {u["ip"]}:{u["port"]} worker {self.route[str(n)][0]}'
+                     for n, u in enumerate(self.units)]
+            send(addr[0], '\n'.join(lines))
+        elif cmd[0].startswith('@') and len(cmd) > 1:
+            target = cmd[0][1:]
+            if target == '*':
+                targets = [(shard, row) for shard, rows in enumerate(self.shards) for row in range(len(rows))]
+            elif target in self.route:
+                targets = [self.route[target]]
+            else:
+                send(addr[0], f'Unknown unit {target}, see "units"')
+                return True
+            for shard, row in targets:
+                self.conns[shard].send((row, cmd[1:], addr))
+        else:
+            send(addr[0], 'Usage: @<unit|*> <command> ...  Route a control command to a unit (see "units").')
+        return True
+
+    def run(self, ip='0.0.0.0', port=6001):
+        """
+        Description: Start the workers and serve the control endpoint until 'quit' (blocking)
+        :param ip: str (control endpoint address)
+        :param port: int (control endpoint port)
+        :return: n/a
+        """
+        client_port = self.config.get('client_port', 6002)
+        in_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        io = DatagramBatcher(in_sock, send_sock=socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+
+        def send_to_client(client_ip, msg):
+            io.queue(msg.encode('utf-8'), (client_ip, client_port))
+
+        try:
+            # Inside the try, so the workers are stopped if the control port cannot be bound
+            self.start()
+            in_sock.bind((ip, port))
+            print(f'Supervisor: {len(self.units)} units on {self.workers} workers, control on {ip}:{port}')
+            running = True
+            persisted = time.monotonic()
+            while running:
+                io.wait(self.PERSIST_INTERVAL)
+                for data, addr in io.drain():
+                    running = self.handle(bytes(data).decode('utf-8').split(), addr, send_to_client) and running
+                io.flush()
+                if time.monotonic() - persisted >= self.PERSIST_INTERVAL:
+                    self.persist()
+                    persisted = time.monotonic()
+                for proc in self.procs:
+                    if not proc.is_alive():
+                        raise RuntimeError(f'Worker {proc.name} exited with code {proc.exitcode}')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            in_sock.close()
+            self.shutdown()
+
+    def shutdown(self):
+        """
+        Description: Stop the workers, persist the final run hours and release the shared memory
+        :return: n/a
+        """
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            proc.join()
+        if self.arrays:
+            self.persist()
+        self.store.close()
+        self.arrays = []
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shard simulated generators across worker processes')
+    parser.add_argument('config', help='JSON host configuration file (see sim_host.py)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the noise (overrides the configuration)')
+    parser.add_argument('--ip', default='0.0.0.0', help='control endpoint address (default %(default)s)')
+    parser.add_argument('--port', type=int, default=6001, help='control endpoint port (default %(default)s)')
+    args = parser.parse_args()
+    with open(args.config, 'r') as f:
+        supervisor = Supervisor(json.load(f), workers=args.workers, seed=args.seed)
+    supervisor.run(args.ip, args.port)
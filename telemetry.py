@@ -0,0 +1,206 @@
+import argparse
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+MAGIC = b'GTLM'
+VERSION = 1
+
+# Region header: magic, layout version, record size, number of records
+HEADER = struct.Struct('<4sHHI')
+# One record per unit. seq is the seqlock counter: odd while the record is being written.
+RECORD = struct.Struct('<QQdddd6IIqq4x')
+SEQ = struct.Struct('<Q')
+PAYLOAD_OFFSET = SEQ.size
+PAYLOAD = struct.Struct('<' + RECORD.format[2:])     # Everything after seq
+
+FIELDS = ('tick_count', 'sim_time', 'accel_current', 'accel_voltage', 'getter_current',
+          'fault_1', 'fault_2', 'fault_3', 'fault_4', 'fault_5', 'fault_6',
+          'system_state', 'run_seconds', 'amp_hours')
+Telemetry = namedtuple('Telemetry', FIELDS)
+
+_exported = set()       # Names of the blocks created by exporters in this process
+
+U32 = 0xffffffff        # Fault words and system state are stored as uint32
+
+
+def region_size(units):
+    return HEADER.size + units * RECORD.size
+
+
+def attach(name):
+    """
+    Description: Attach to an existing shared memory block without taking ownership of it (the block is not
+    unlinked when this process exits)
+    :param name: str
+    :return: SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:   # Python < 3.13 registers every attached block with the resource tracker
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _exported:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class TelemetryExporter:
+    """
+    Publishes live telemetry into a named shared memory block so same-host observers can sample it
+    at any rate without syscalls or serialization. The block holds a header followed by one
+    fixed-size record per unit (see RECORD and FIELDS).
+
+    Each record is guarded by a seqlock: the writer (the physics thread, once per tick) makes the
+    sequence counter odd, writes the record and makes it even again. A reader that sees an odd
+    counter, or a counter that changed while it copied the record, retries (see TelemetryReader).
+    """
+    def __init__(self, name, units=1):
+        """
+        :param name: str (shared memory block name, replaced if it already exists)
+        :param units: int (number of records)
+        """
+        try:
+            shm = attach(name)
+            shm.unlink()
+            shm.close()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=region_size(units))
+        _exported.add(name)
+        self.buf = self.shm.buf
+        self.units = units
+        self.seq = [0] * units
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, RECORD.size, units)
+        self.records = None     # Structured array view of the records, created by write_fleet
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, row, snap, sim_time):
+        """
+        Description: Publish the telemetry of one unit
+        :param row: int (record index)
+        :param snap: StateSnapshot (see GenSimulator.publish)
+        :param sim_time: float (simulation clock)
+        :return: n/a
+        """
+        offset = HEADER.size + row * RECORD.size
+        seq = self.seq[row]
+        SEQ.pack_into(self.buf, offset, seq + 1)
+        try:
+            PAYLOAD.pack_into(self.buf, offset + PAYLOAD_OFFSET, snap.tick_count, sim_time,
+                              snap.accel_current, snap.accel_voltage, snap.getter_current,
+                              snap.fault_1 & U32, snap.fault_2 & U32, snap.fault_3 & U32,
+                              snap.fault_4 & U32, snap.fault_5 & U32, snap.fault_6 & U32,
+                              snap.system_state & U32, snap.run_seconds, snap.amp_hours)
+        finally:
+            # Never leave the record marked as being written, readers would wait on it forever
+            SEQ.pack_into(self.buf, offset, seq + 2)
+            self.seq[row] = seq + 2
+
+    def write_fleet(self, fleet, tick_count, sim_time):
+        """
+        Description: Publish the telemetry of every unit of a fleet, one batched copy per field
+        :param fleet: GenFleet
+        :param tick_count: int
+        :param sim_time: float (simulation clock)
+        :return: n/a
+        """
+        import numpy as np
+
+        if self.records is None:
+            dtype = np.dtype([('seq', '<u8'), ('tick_count', '<u8'), ('sim_time', '<f8'),
+                              ('accel_current', '<f8'), ('accel_voltage', '<f8'), ('getter_current', '<f8')] +
+                             [(f'fault_{n}', '<u4') for n in range(1, 7)] +
+                             [('system_state', '<u4'), ('run_seconds', '<i8'), ('amp_hours', '<i8'),
+                              ('pad', 'V4')])
+            assert dtype.itemsize == RECORD.size
+            self.records = np.ndarray(self.units, dtype=dtype, buffer=self.buf, offset=HEADER.size)
+        records = self.records
+        records['seq'] += 1
+        records['tick_count'] = tick_count
+        records['sim_time'] = sim_time
+        for name in FIELDS[2:]:
+            records[name] = getattr(fleet, name)
+        records['seq'] += 1
+
+    def close(self):
+        """
+        Description: Remove the shared memory block
+        :return: n/a
+        """
+        self.records = None
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _exported.discard(self.name)
+
+
+class TelemetryReader:
+    """
+    Samples the telemetry published by a TelemetryExporter in another process
+    """
+    MAX_RETRIES = 100000        # Consistent copy attempts before read() gives up on a stalled writer
+
+    def __init__(self, name):
+        """
+        :param name: str (shared memory block name)
+        :raises FileNotFoundError: if no simulator is exporting telemetry under this name
+        :raises ValueError: if the block does not hold telemetry of this layout version
+        """
+        self.shm = attach(name)
+        self.buf = self.shm.buf
+        magic, version, record_size, units = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f'Shared memory block {name} does not hold version {VERSION} telemetry')
+        self.units = units
+        self.retries = 0
+
+    def read(self, row=0):
+        """
+        Description: Consistent copy of one unit's record, retrying while the writer is updating it
+        :param row: int (record index)
+        :return: Telemetry
+        :raises TimeoutError: if no consistent copy could be taken in MAX_RETRIES attempts (writer stalled)
+        """
+        offset = HEADER.size + row * RECORD.size
+        buf = self.buf
+        for _ in range(self.MAX_RETRIES):
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if not seq & 1:
+                values = PAYLOAD.unpack_from(buf, offset + PAYLOAD_OFFSET)
+                if SEQ.unpack_from(buf, offset)[0] == seq:
+                    return Telemetry._make(values)
+            self.retries += 1
+        raise TimeoutError(f'Telemetry record {row} is stuck being written')
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the telemetry exported by a simulator')
+    parser.add_argument('name', help='shared memory block name (gensim.py --telemetry / host "telemetry")')
+    parser.add_argument('--unit', type=int, default=0, help='record index (default %(default)s)')
+    parser.add_argument('--rate', type=float, default=2, help='samples per second (default %(default)s)')
+    args = parser.parse_args()
+    reader = TelemetryReader(args.name)
+    try:
+        while True:
+            t = reader.read(args.unit)
+            print(f'tick {t.tick_count}  state 0x{t.system_state:04X}  I {t.accel_current:.2f}  '
+                  f'V {t.accel_voltage:.1f}  getter {t.getter_current:.2f}  '
+                  f'faults {" ".join(f"0x{f:04X}" for f in t[5:11])}  run {t.run_seconds} s  {t.amp_hours} uAh')
+            time.sleep(1 / args.rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()